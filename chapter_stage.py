@@ -0,0 +1,54 @@
+"""
+章节的 CPU 阶段：解析并提取文本段、回填译文并序列化。
+
+这里都是只依赖参数的纯函数，参数和返回值都可以 pickle，可以提交到 ProcessPoolExecutor 在多个进程中执行，
+解析和序列化不再受 GIL 限制。文本节点用遍历顺序中的序号标识：提取和回填使用同一个解析器遍历同一份原文，序号一一对应。
+"""
+from xhtml_parser import XHTMLParser
+
+# 每个进程按解析器名称缓存的 XHTMLParser
+_parsers = {}
+
+
+def get_parser(parser_name):
+    parser = _parsers.get(parser_name)
+    if parser is None:
+        parser = _parsers[parser_name] = XHTMLParser(parser_name)
+    return parser
+
+
+def extract_segments(xhtml_content, chapter_item, parser_name, segment_filter):
+    """解析章节，检测章节是否已经翻译并提取需要翻译的文本节点
+
+    :param xhtml_content: 章节原文
+    :param chapter_item: 章节名称，用于日志
+    :param parser_name: auto、lxml 或 html.parser
+    :param segment_filter: SegmentFilter
+    :return: (实际使用的解析器名称, ChapterDetection, [(节点序号, 节点文本)])
+    """
+    parser, document = get_parser(parser_name).parse(xhtml_content, chapter_item)
+    detection = segment_filter.detect_chapter(
+        node_text for handle, node_text in parser.iter_text_nodes(document, segment_filter.tags))
+    segments = [(index, node_text)
+                for index, (handle, node_text) in enumerate(parser.iter_text_nodes(document, segment_filter.tags))
+                if segment_filter.is_translatable(node_text)]
+    return parser.name, detection, segments
+
+
+def apply_translations(xhtml_content, chapter_item, parser_name, tags, translations):
+    """重新解析章节，把译文回填到对应序号的文本节点并序列化
+
+    :param parser_name: extract_segments 返回的实际使用的解析器名称
+    :param tags: 需要翻译的标签集合
+    :param translations: {节点序号: 译文}
+    :return: 翻译后的 XHTML 字符串
+    """
+    parser, document = get_parser(parser_name).parse(xhtml_content, chapter_item)
+    handles = [(handle, translations[index])
+               for index, (handle, node_text) in enumerate(parser.iter_text_nodes(document, tags))
+               if index in translations]
+    # 遍历结束后再替换，html.parser 也可以安全替换
+    for handle, translated_text in handles:
+        parser.replace_text(handle, translated_text)
+    return parser.serialize(document)
+
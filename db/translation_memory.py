@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TranslationMemory:
+    """翻译记忆库：以内容哈希为键的磁盘缓存（SQLite），前面加一层进程内 LRU。
+
+    键由 (规范化原文, 源语言, 目标语言, 翻译接口, 模型, 翻译模式) 计算得出，
+    与具体书籍无关，因此可以在章节、书籍以及多次运行之间共享。
+    写入先进入 LRU 立即可查，再由写线程批量写入磁盘（一个任务的结果一次 executemany 和一次提交），
+    调用方（包括异步模式的事件循环线程）不等待磁盘同步。
+    """
+
+    def __init__(self, db_path, lru_size=10000):
+        """初始化翻译记忆库。
+
+        :param db_path: 数据库文件路径，目录不存在时自动创建
+        :param lru_size: 进程内 LRU 缓存的最大条目数
+        """
+        self.db_path = db_path
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_queue = queue.Queue()
+        self._writer = None
+
+        db_directory = os.path.dirname(db_path)
+        if db_directory:
+            os.makedirs(db_directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # WAL 模式下 NORMAL 只在检查点时同步磁盘，提交不再逐次 fsync
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS translation_memory (
+                memory_key TEXT PRIMARY KEY,
+                source_text TEXT NOT NULL,
+                source_lang TEXT NOT NULL,
+                dest_lang TEXT NOT NULL,
+                backend TEXT NOT NULL,
+                model TEXT NOT NULL,
+                trans_mode INTEGER NOT NULL,
+                translation TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self.connection.commit()
+
+    @staticmethod
+    def normalize(text):
+        """规范化原文：合并连续空白并去掉首尾空白"""
+        return ' '.join(str(text).split())
+
+    @classmethod
+    def make_key(cls, text, source_lang, dest_lang, backend, model, trans_mode):
+        """计算翻译记忆的内容哈希键"""
+        payload = json.dumps([cls.normalize(text), source_lang, dest_lang, backend, model, trans_mode],
+                             ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _remember(self, key, translation):
+        """写入 LRU，超出容量时淘汰最久未使用的条目（调用方需持有锁）"""
+        self._lru[key] = translation
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, text, source_lang, dest_lang, backend, model, trans_mode):
+        """查询译文，未命中返回 None"""
+        key = self.make_key(text, source_lang, dest_lang, backend, model, trans_mode)
+        with self._lock:
+            translation = self._lru.get(key)
+            if translation is not None:
+                self._lru.move_to_end(key)
+                return translation
+            try:
+                row = self.connection.execute(
+                    'SELECT translation FROM translation_memory WHERE memory_key = ?', (key,)).fetchone()
+            except sqlite3.Error as e:
+                print(f"An error occurred while reading translation memory: {e}")
+                return None
+            if row is None:
+                return None
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, text, source_lang, dest_lang, backend, model, trans_mode, translation):
+        """保存译文"""
+        self.put_many([(text, translation)], source_lang, dest_lang, backend, model, trans_mode)
+
+    def put_many(self, segments, source_lang, dest_lang, backend, model, trans_mode):
+        """批量保存译文：立即写入 LRU，磁盘写入交给写线程
+
+        :param segments: [(原文, 译文)]
+        """
+        if not segments:
+            return
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, translation in segments:
+                key = self.make_key(text, source_lang, dest_lang, backend, model, trans_mode)
+                self._remember(key, translation)
+                rows.append((key, self.normalize(text), source_lang, dest_lang, backend, model, trans_mode,
+                             translation, now))
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, name='TranslationMemoryWriter',
+                                                daemon=True)
+                self._writer.start()
+        self._write_queue.put(rows)
+
+    def _writer_loop(self):
+        """写线程：把队列中积压的所有译文合并为一次 executemany，在一个事务中提交"""
+        while True:
+            batches = [self._write_queue.get()]
+            while batches[-1] is not None:
+                try:
+                    batches.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batches[-1] is None
+            rows = [row for batch in batches if batch is not None for row in batch]
+            if rows:
+                with self._lock:
+                    try:
+                        self.connection.executemany('''
+                            INSERT OR REPLACE INTO translation_memory
+                            (memory_key, source_text, source_lang, dest_lang, backend, model, trans_mode,
+                             translation, updated_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ''', rows)
+                        self.connection.commit()
+                    except sqlite3.Error as e:
+                        print(f"An error occurred while writing translation memory: {e}")
+            if stop:
+                return
+
+    def close(self):
+        """写完队列中的译文后关闭数据库连接"""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._write_queue.put(None)
+            writer.join()
+        with self._lock:
+            try:
+                self.connection.close()
+            except sqlite3.Error as e:
+                print(f"An error occurred while closing translation memory: {e}")
+
+    def __repr__(self):
+        return f"<TranslationMemory(db_path='{self.db_path}', lru_size={self.lru_size})>"
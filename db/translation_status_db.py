@@ -1,13 +1,33 @@
 import os
+import queue
 import sqlite3
+import threading
+from concurrent.futures import Future
+
+# 写线程一次事务最多合并的写操作数
+GROUP_COMMIT_SIZE = 256
+# 每个连接缓存的预编译语句数
+CACHED_STATEMENTS = 64
 
 
 class TranslationStatusDB:
+    """章节翻译状态数据库。
+
+    所有写操作由一个写线程执行：各线程把写操作放入队列，写线程把队列中积压的操作合并到一个事务中提交（group commit），
+    提交后再通知等待的调用方；读操作使用每个线程各自的只读连接。连接复用，预编译语句由 sqlite3 的语句缓存复用。
+    """
     # 状态常量
     STATUS_PENDING = 0  # 未开始
     STATUS_IN_PROGRESS = 1  # 进行中
     STATUS_COMPLETED = 2  # 完成
     STATUS_ERROR = 3  # 异常退出
+    # 状态描述（同时写入 status_description 表）
+    STATUS_DESCRIPTIONS = {
+        STATUS_PENDING: '未开始',
+        STATUS_IN_PROGRESS: '进行中',
+        STATUS_COMPLETED: '完成',
+        STATUS_ERROR: '异常退出',
+    }
 
     def __init__(self, db_name='translation_status.db', db_directory='.'):
         """初始化 TranslationStatusDB 类。
@@ -20,29 +40,138 @@ class TranslationStatusDB:
         self.db_path = os.path.join(db_directory, db_name)
         # self.create_tables()
         # self.connection = None
-        self.connections = []  # 新增一个列表来存储所有数据库连接
+        self.connections = []  # 所有线程的读连接，关闭时统一释放
+        self._connections_lock = threading.Lock()
+        self._local = threading.local()
+        self._write_queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def relative_path(self, chapter_path):
+        """章节路径转换为相对书籍根目录（数据库所在目录）的存储形式，数据库随目录移动后仍然有效"""
+        return os.path.relpath(chapter_path, self.db_directory).replace(os.sep, '/')
+
+    def chapter_path(self, relative_path):
+        """relative_path 的逆运算：存储形式转换为章节路径"""
+        return os.path.join(self.db_directory, *relative_path.split('/'))
 
     def connect(self):
-        """建立数据库连接"""
-        # if self.connection is None:
-        #     self.connection = sqlite3.connect(self.db_path)
-        #     # 设置WAL模式
-        #     self.connection.execute('PRAGMA journal_mode=WAL')
-        # return self.connection
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        # 设置WAL模式
-        conn.execute('PRAGMA journal_mode=WAL')
-        self.connections.append(conn)  # 将新连接添加到连接列表
+        """返回当前线程的读连接（每个线程一个，重复使用）"""
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+            # 设置WAL模式：读不阻塞写
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = conn
+            with self._connections_lock:
+                self.connections.append(conn)  # 将新连接添加到连接列表
         return conn
 
+    def _start_writer(self):
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._writer_loop, name='TranslationStatusDBWriter',
+                                                daemon=True)
+                self._writer.start()
+
+    def _writer_loop(self):
+        """写线程：取出队列中积压的所有写操作，在一个事务中执行并提交
+
+        任何异常都会交给对应的调用方，写线程不会因此退出，等待中的调用方不会永远阻塞。
+        """
+        try:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, cached_statements=CACHED_STATEMENTS)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # WAL 模式下 NORMAL 只在检查点时同步磁盘，提交不再逐次 fsync
+            conn.execute('PRAGMA synchronous=NORMAL')
+        except Exception as e:
+            # 无法打开写连接：让队列中的调用方全部收到异常，下一次写操作会重新启动写线程
+            self._fail_pending(e)
+            return
+        try:
+            while True:
+                operations = [self._write_queue.get()]
+                while operations[-1] is not None and len(operations) < GROUP_COMMIT_SIZE:
+                    try:
+                        operations.append(self._write_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = operations[-1] is None
+                if stop:
+                    operations.pop()
+                try:
+                    if operations:
+                        self._commit_group(conn, operations)
+                except Exception as e:
+                    for func, future in operations:
+                        if not future.done():
+                            future.set_exception(e)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _fail_pending(self, error):
+        """让队列中尚未执行的写操作全部以 error 结束"""
+        while True:
+            try:
+                operation = self._write_queue.get_nowait()
+            except queue.Empty:
+                return
+            if operation is not None:
+                operation[1].set_exception(error)
+
+    @staticmethod
+    def _commit_group(conn, operations):
+        """在一个事务中执行一组写操作：每个操作一个保存点，单个操作失败只回滚它自己"""
+        results = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for func, future in operations:
+                conn.execute('SAVEPOINT operation')
+                try:
+                    results.append((future, func(conn), None))
+                    conn.execute('RELEASE operation')
+                except Exception as e:
+                    conn.execute('ROLLBACK TO operation')
+                    conn.execute('RELEASE operation')
+                    results.append((future, None, e))
+            conn.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            results = [(future, None, e) for func, future in operations]
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _write(self, func):
+        """把写操作交给写线程执行，等待所在事务提交后返回 func(connection) 的结果
+
+        :param func: 接收写连接的函数，不要在其中提交事务
+        """
+        self._start_writer()
+        future = Future()
+        self._write_queue.put((func, future))
+        return future.result()
+
     def close_all_connections(self):
-        """关闭所有数据库连接"""
-        for conn in self.connections:
+        """停止写线程并关闭所有数据库连接"""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None and writer.is_alive():
+            self._write_queue.put(None)
+            writer.join()
+        with self._connections_lock:
+            connections, self.connections = self.connections, []  # 清空连接列表
+        for conn in connections:
             try:
                 conn.close()  # 关闭连接
             except sqlite3.Error as e:
                 print(f"An error occurred while closing a connection: {e}")
-        self.connections = []  # 清空连接列表
+        self._local = threading.local()
 
     # def close(self):
     #     """关闭数据库连接"""
@@ -52,36 +181,59 @@ class TranslationStatusDB:
 
     def create_tables(self):
         """创建数据表"""
-        try:
-            with self.connect() as connection:
-                cursor = connection.cursor()
-                # 创建翻译状态表
+        def create(connection):
+            cursor = connection.cursor()
+            # 创建翻译状态表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS translation_status (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chapter_path TEXT NOT NULL,
+                    status INTEGER NOT NULL,
+                    error_message TEXT
+                )
+            ''')
+            # 创建状态描述表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS status_description (
+                    id INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL
+                )
+            ''')
+            # 创建文本段日志表：记录章节中已完成文本段的译文，中断后恢复时不再重复请求
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS segment_journal (
+                    chapter_path TEXT NOT NULL,
+                    segment_hash TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    PRIMARY KEY (chapter_path, segment_hash)
+                )
+            ''')
+            # 旧版本保存的是完整路径且没有唯一索引：转换为相对路径并去掉重复记录
+            rows = cursor.execute('SELECT id, chapter_path FROM translation_status').fetchall()
+            prefix = os.path.join(self.db_directory, '')
+            legacy_rows = [(self.relative_path(path), row_id) for row_id, path in rows
+                           if os.path.isabs(path) or path.startswith(prefix)]
+            if legacy_rows:
+                cursor.executemany('UPDATE translation_status SET chapter_path = ? WHERE id = ?', legacy_rows)
                 cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS translation_status (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        chapter_path TEXT NOT NULL,
-                        status INTEGER NOT NULL,
-                        error_message TEXT
-                    )
+                    DELETE FROM translation_status
+                    WHERE id NOT IN (SELECT MAX(id) FROM translation_status GROUP BY chapter_path)
                 ''')
-                # 创建状态描述表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS status_description (
-                        id INTEGER PRIMARY KEY,
-                        description TEXT NOT NULL
-                    )
-                ''')
-                # 插入状态描述
-                cursor.execute('DELETE FROM status_description')  # 清空表以避免重复插入
-                cursor.executemany('''
-                    INSERT INTO status_description (id, description) VALUES (?, ?)
-                ''', [
-                    (self.STATUS_PENDING, '未开始'),
-                    (self.STATUS_IN_PROGRESS, '进行中'),
-                    (self.STATUS_COMPLETED, '完成'),
-                    (self.STATUS_ERROR, '异常退出')
-                ])
-                connection.commit()
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_translation_status_chapter_path
+                ON translation_status (chapter_path)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_translation_status_status ON translation_status (status)
+            ''')
+            # 插入状态描述
+            cursor.execute('DELETE FROM status_description')  # 清空表以避免重复插入
+            cursor.executemany('''
+                INSERT INTO status_description (id, description) VALUES (?, ?)
+            ''', list(self.STATUS_DESCRIPTIONS.items()))
+
+        try:
+            self._write(create)
         except sqlite3.Error as e:
             print(f"An error occurred while creating tables: {e}")
 
@@ -92,20 +244,35 @@ class TranslationStatusDB:
         :param status: 翻译状态，应为常量
         :param error_message: 错误信息（可选）
         """
-        if status not in (self.STATUS_PENDING, self.STATUS_IN_PROGRESS, self.STATUS_COMPLETED, self.STATUS_ERROR):
+        if status not in self.STATUS_DESCRIPTIONS:
             raise ValueError("Invalid status value.")
 
+        relative_path = self.relative_path(chapter_path)
         try:
-            with self.connect() as connection:
-                cursor = connection.cursor()
-                cursor.execute('''
-                    INSERT INTO translation_status (chapter_path, status, error_message)
-                    VALUES (?, ?, ?)
-                ''', (chapter_path, status, error_message))
-                connection.commit()
+            self._write(lambda connection: connection.execute('''
+                INSERT INTO translation_status (chapter_path, status, error_message)
+                VALUES (?, ?, ?)
+            ''', (relative_path, status, error_message)))
         except sqlite3.Error as e:
             print(f"An error occurred while inserting status: {e}")
 
+    def insert_statuses(self, chapter_paths, status):
+        """批量插入翻译状态（一个事务），已存在的章节保持不变
+
+        :param chapter_paths: 章节路径列表
+        :param status: 翻译状态，应为常量
+        """
+        if status not in self.STATUS_DESCRIPTIONS:
+            raise ValueError("Invalid status value.")
+
+        rows = [(self.relative_path(chapter_path), status) for chapter_path in chapter_paths]
+        try:
+            self._write(lambda connection: connection.executemany('''
+                INSERT OR IGNORE INTO translation_status (chapter_path, status) VALUES (?, ?)
+            ''', rows))
+        except sqlite3.Error as e:
+            print(f"An error occurred while inserting statuses: {e}")
+
     def update_status(self, chapter_path, status, error_message=None):
         """更新翻译状态
 
@@ -113,31 +280,25 @@ class TranslationStatusDB:
         :param status: 新的翻译状态，应为常量
         :param error_message: 错误信息（可选）
         """
-        if status not in (self.STATUS_PENDING, self.STATUS_IN_PROGRESS, self.STATUS_COMPLETED, self.STATUS_ERROR):
+        if status not in self.STATUS_DESCRIPTIONS:
             raise ValueError("Invalid status value.")
 
+        relative_path = self.relative_path(chapter_path)
         try:
-            with self.connect() as connection:
-                cursor = connection.cursor()
-                cursor.execute('''
-                    UPDATE translation_status
-                    SET status = ?, error_message = ?
-                    WHERE chapter_path = ?
-                ''', (status, error_message, chapter_path))
-                connection.commit()
-                if cursor.rowcount == 0:
-                    print(f"没有找到章节 '{chapter_path}' 的记录。")
-                else:
-                    # 查询状态描述
-                    cursor.execute('SELECT description FROM status_description WHERE id = ?', (status,))
-                    status_description_row = cursor.fetchone()
-                    status_description = status_description_row[0] if status_description_row else '未知状态'
-                    print(f"章节 '{chapter_path}' 的翻译状态已更新为 '{status_description}'。")
+            rowcount = self._write(lambda connection: connection.execute('''
+                UPDATE translation_status
+                SET status = ?, error_message = ?
+                WHERE chapter_path = ?
+            ''', (status, error_message, relative_path)).rowcount)
+            if rowcount == 0:
+                print(f"没有找到章节 '{chapter_path}' 的记录。")
+            else:
+                print(f"章节 '{chapter_path}' 的翻译状态已更新为 '{self.STATUS_DESCRIPTIONS[status]}'。")
         except sqlite3.Error as e:
             print(f"An error occurred while updating status: {e}")
 
     def get_all_statuses(self):
-        """获取所有翻译状态"""
+        """获取所有翻译状态（章节路径为相对书籍根目录的存储形式）"""
         try:
             with self.connect() as connection:
                 cursor = connection.cursor()
@@ -153,7 +314,8 @@ class TranslationStatusDB:
         try:
             with self.connect() as connection:
                 cursor = connection.cursor()
-                cursor.execute('SELECT * FROM translation_status WHERE chapter_path = ?', (chapter_path,))
+                cursor.execute('SELECT * FROM translation_status WHERE chapter_path = ?',
+                               (self.relative_path(chapter_path),))
                 row = cursor.fetchone()
             return row
         except sqlite3.Error as e:
@@ -177,13 +339,54 @@ class TranslationStatusDB:
         try:
             with self.connect() as connection:
                 cursor = connection.cursor()
-                cursor.execute('SELECT chapter_path FROM translation_status WHERE status != ?',
-                               (self.STATUS_COMPLETED,))
+                # 用 IN 列出未完成的状态，查询可以走 status 索引
+                cursor.execute('SELECT chapter_path FROM translation_status WHERE status IN (?, ?, ?) ORDER BY id',
+                               (self.STATUS_PENDING, self.STATUS_IN_PROGRESS, self.STATUS_ERROR))
                 rows = cursor.fetchall()
-            return [row[0] for row in rows]  # 返回章节路径列表
+            return [self.chapter_path(row[0]) for row in rows]  # 返回章节路径列表
         except sqlite3.Error as e:
             print(f"An error occurred while fetching articles not completed: {e}")
             return []
 
+    def insert_segments(self, chapter_path, segments):
+        """批量记录章节中已完成的文本段（一个事务）
+
+        :param chapter_path: 章节路径
+        :param segments: [(文本段哈希, 译文)]
+        """
+        if not segments:
+            return
+        relative_path = self.relative_path(chapter_path)
+        rows = [(relative_path, segment_hash, translation) for segment_hash, translation in segments]
+        try:
+            self._write(lambda connection: connection.executemany('''
+                INSERT OR REPLACE INTO segment_journal (chapter_path, segment_hash, translation)
+                VALUES (?, ?, ?)
+            ''', rows))
+        except sqlite3.Error as e:
+            print(f"An error occurred while inserting segments for {chapter_path}: {e}")
+
+    def get_segments(self, chapter_path):
+        """获取章节已记录的文本段 {文本段哈希: 译文}"""
+        try:
+            with self.connect() as connection:
+                cursor = connection.cursor()
+                cursor.execute('SELECT segment_hash, translation FROM segment_journal WHERE chapter_path = ?',
+                               (self.relative_path(chapter_path),))
+                rows = cursor.fetchall()
+            return dict(rows)
+        except sqlite3.Error as e:
+            print(f"An error occurred while fetching segments for {chapter_path}: {e}")
+            return {}
+
+    def delete_segments(self, chapter_path):
+        """删除章节的文本段记录（章节翻译完成并写回后不再需要）"""
+        relative_path = self.relative_path(chapter_path)
+        try:
+            self._write(lambda connection: connection.execute('DELETE FROM segment_journal WHERE chapter_path = ?',
+                                                              (relative_path,)))
+        except sqlite3.Error as e:
+            print(f"An error occurred while deleting segments for {chapter_path}: {e}")
+
     def __repr__(self):
         return f"<TranslationStatusDB(db_name='{self.db_name}', db_directory='{self.db_directory}')>"
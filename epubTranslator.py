@@ -1,7 +1,6 @@
 import fnmatch
 import logging
 import os
-import random
 import re
 import shutil
 import signal
@@ -15,15 +14,15 @@ import queue
 import threading
 
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from itertools import cycle
+from functools import partial
 
-from bs4 import BeautifulSoup, NavigableString
-from translate_api.google_translate_v2 import google_translator
+from translate_api.google_translate_v2 import google_translator, close_sessions
 from tqdm import tqdm
 
 from xhtmlTranslate import XHTMLTranslator, Logger
 from db.translation_status_db import TranslationStatusDB
-from languageDetect import contains_language
+from epub_archive import list_xhtml_members, member_name, member_path, repack_epub
+from work_scheduler import build_segment_counter, order_chapters, read_spine
 
 
 def signal_handler(sig, frame):
@@ -33,30 +32,86 @@ def signal_handler(sig, frame):
     sys.exit(0)
 
 
+class BookContext:
+    """一本书的处理状态：工作目录、状态数据库和（压缩包内模式下）打开的源 EPUB，多本书同时处理时互不干扰"""
+
+    def __init__(self, epub_path):
+        self.epub_path = epub_path
+        self.base_name = os.path.splitext(epub_path)[0]
+        self.work_dir = f"{self.base_name}_translated"
+        self.output_file = f"{self.base_name}_translated.epub"
+        self.translate_db = None
+        self.source_archive = None
+        self.source_archive_lock = threading.Lock()
+
+    def open_source_archive(self):
+        """压缩包内模式：打开源 EPUB，供各章节线程读取"""
+        self.close_source_archive()
+        self.source_archive = zipfile.ZipFile(self.epub_path, 'r')
+
+    def close_source_archive(self):
+        with self.source_archive_lock:
+            if self.source_archive is not None:
+                self.source_archive.close()
+                self.source_archive = None
+
+    def close(self):
+        """关闭源 EPUB 和状态数据库连接"""
+        self.close_source_archive()
+        if self.translate_db is not None:
+            self.translate_db.close_all_connections()
+
+    def __repr__(self):
+        return f"<BookContext(epub_path='{self.epub_path}', work_dir='{self.work_dir}')>"
+
+
 class EPUBTranslator(XHTMLTranslator):
-    # 定义类属性
-    translate_db = None
 
     def __init__(self, file_paths, processes, http_proxy, log_file, log_level, gtransapi_suffixes, dest_lang,
-                 trans_mode, translate_thread_workers, tags_to_translate, translator_api='google', **translator_kwargs):
+                 trans_mode, translate_thread_workers, tags_to_translate, translator_api='google',
+                 batch_max_chars=4500, translation_memory_path=None, translation_memory_lru_size=10000,
+                 concurrency_mode='thread', async_max_concurrency=64, async_per_host_limit=8,
+                 rate_limits=None, zhipu_batch_max_tokens=1500, in_archive=False, compress_level=6,
+                 xhtml_parser='auto', source_lang='auto', translated_ratio=0.9, parse_processes=0, max_books=1,
+                 **translator_kwargs):
         self.file_paths = file_paths
         self.processes = processes
+        # 压缩包内处理模式：章节直接从源 EPUB 读取，工作目录只保存已翻译章节和状态数据库
+        self.in_archive = in_archive
+        # 同时处理的书籍数：所有书共享翻译线程池、翻译记忆、去重登记表和连接池，各自使用自己的状态数据库
+        self.max_books = max(1, max_books)
+        self._books = {}  # 章节路径 -> BookContext
+        self._books_lock = threading.Lock()
+        self.book_results = {}  # 最近一次 translate() 中每本书的结果
+        # 组装译本时的压缩级别（0-9），越小越快、文件越大
+        self.compress_level = compress_level
         super(EPUBTranslator, self).__init__(http_proxy, gtransapi_suffixes, dest_lang,
                                              trans_mode, translate_thread_workers, tags_to_translate,
-                                             translator_api, **translator_kwargs)
-
-        self.gtransapi_suffixes = gtransapi_suffixes.split(',')
-        self.gtransapi_suffixes_cycle = cycle(self.gtransapi_suffixes)  # 使用无限循环
+                                             translator_api, batch_max_chars=batch_max_chars,
+                                             translation_memory_path=translation_memory_path,
+                                             translation_memory_lru_size=translation_memory_lru_size,
+                                             concurrency_mode=concurrency_mode,
+                                             async_max_concurrency=async_max_concurrency,
+                                             async_per_host_limit=async_per_host_limit,
+                                             rate_limits=rate_limits,
+                                             zhipu_batch_max_tokens=zhipu_batch_max_tokens,
+                                             xhtml_parser=xhtml_parser,
+                                             source_lang=source_lang,
+                                             translated_ratio=translated_ratio,
+                                             parse_processes=parse_processes,
+                                             **translator_kwargs)
 
         # 实例化日志类
         self.logger = Logger(log_file=log_file, level=log_level)
 
-    @classmethod
-    def initialize_db(cls, db_name='translation_status.db', db_directory='.'):
+    @staticmethod
+    def initialize_db(db_name='translation_status.db', db_directory='.'):
         """
-        初始化数据库，修改类属性translate_db为TranslationStatusDB类的实例化
+        初始化一本书的状态数据库并创建数据表（旧版本创建的数据库会补上新增的表和索引）
         """
-        cls.translate_db = TranslationStatusDB(db_name=db_name, db_directory=db_directory)
+        translate_db = TranslationStatusDB(db_name=db_name, db_directory=db_directory)
+        translate_db.create_tables()
+        return translate_db
 
     @staticmethod
     def extract_epub(epub_file, output_dir):
@@ -73,13 +128,22 @@ class EPUBTranslator(XHTMLTranslator):
         except Exception as e:
             logging.error(f'An error occurred while extracting {epub_file}: {e}')
 
-    def create_epub_from_directory(self, input_dir, output_file):
+    def create_epub_from_directory(self, input_dir, output_file, source_epub=None):
         # 确保 output_file 是字符串类型
         if isinstance(output_file, bytes):
             output_file = output_file.decode('utf-8')  # 转换为字符串
 
+        # 有源 EPUB 时只压缩有变化的成员，其余成员原样复制原压缩数据
+        if source_epub and os.path.exists(source_epub):
+            # 工作目录中的状态数据库不写入译本
+            exclude = [f"translation_status.db{suffix}" for suffix in ('', '-wal', '-shm', '-journal')]
+            compressed, copied = repack_epub(source_epub, output_file, input_dir, exclude, self.compress_level)
+            self.logger.info(f"Created '{output_file}' from '{input_dir}' "
+                             f"({compressed} members compressed, {copied} copied as-is)")
+            return
+
         # 先创建一个新的 EPUB 文件
-        with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED, compresslevel=self.compress_level) as zip_ref:
             # 只写入 mimetype 文件，确保它是第一个文件且不压缩
             zip_ref.write(os.path.join(input_dir, 'mimetype'), 'mimetype', compress_type=zipfile.ZIP_STORED)
 
@@ -115,40 +179,112 @@ class EPUBTranslator(XHTMLTranslator):
 
         return xhtml_files
 
+    def register_chapters(self, book, chapters):
+        """登记章节所属的书"""
+        with self._books_lock:
+            for chapter_item in chapters:
+                self._books[chapter_item] = book
+
+    def unregister_book(self, book):
+        with self._books_lock:
+            chapters = [chapter_item for chapter_item, chapter_book in self._books.items() if chapter_book is book]
+            for chapter_item in chapters:
+                del self._books[chapter_item]
+                self.chapter_priorities.pop(chapter_item, None)
+
+    def book_of(self, chapter_item):
+        """章节所属的书"""
+        with self._books_lock:
+            return self._books[chapter_item]
+
+    def dedup_scope(self, chapter_item):
+        """每本书一个去重登记表，书处理完时释放"""
+        return self.book_of(chapter_item)
+
+    def read_chapter(self, chapter_item):
+        """读取章节内容：压缩包内模式下尚未翻译的章节直接从源 EPUB 读取"""
+        with self._books_lock:
+            book = self._books.get(chapter_item)
+        if book is None or book.source_archive is None or os.path.exists(chapter_item):
+            return super(EPUBTranslator, self).read_chapter(chapter_item)
+        with book.source_archive_lock:
+            data = book.source_archive.read(member_name(book.work_dir, chapter_item))
+        return data.decode('utf-8')
+
+    @staticmethod
+    def read_member(book, name):
+        """读取源 EPUB 中的成员（bytes），成员不存在时抛出 KeyError 或 OSError"""
+        if book.source_archive is not None:
+            with book.source_archive_lock:
+                return book.source_archive.read(name)
+        with open(member_path(book.work_dir, name), 'rb') as file:
+            return file.read()
+
+    def plan_chapters(self, book, chapters):
+        """估算每个章节的工作量（文本段数），按最长作业优先排列章节并设置翻译优先级
+
+        :param chapters: 需要翻译的章节路径
+        :return: 排好序的章节路径
+        """
+        spine = read_spine(partial(self.read_member, book))
+        spine_paths = {member_path(book.work_dir, name): position for position, name in enumerate(spine)}
+        spine_positions = {chapter_item: spine_paths[os.path.abspath(chapter_item)] for chapter_item in chapters
+                           if os.path.abspath(chapter_item) in spine_paths}
+        count_segments = build_segment_counter(self.segment_filter.tags)
+
+        works = {}
+        for chapter_item in chapters:
+            try:
+                works[chapter_item] = count_segments(self.read_chapter(chapter_item))
+            except (OSError, KeyError, UnicodeDecodeError) as e:
+                self.logger.warning(f"Unable to estimate the work of chapter {chapter_item}: {e}")
+                works[chapter_item] = 0
+
+        ordered = order_chapters(chapters, works, spine_positions)
+        # 优先级为工作量的相反数：工作量大的章节的文本段先从共享线程池中取出（同时处理的多本书之间也是如此）
+        self.chapter_priorities.update((chapter_item, -works[chapter_item]) for chapter_item in ordered)
+        self.logger.debug(f"Chapter plan (segments): {[(chapter_item, works[chapter_item]) for chapter_item in ordered]}")
+        self.logger.info(f"Estimated {sum(works.values())} segments in {len(ordered)} chapters of {book.epub_path}, "
+                         f"{len(spine)} chapters in the spine")
+        return ordered
+
     def translate_chapter(self, chapter_item):
 
         self.logger.info(f"Starting translation for chapter {chapter_item}")
-        EPUBTranslator.translate_db.update_status(chapter_item, EPUBTranslator.translate_db.STATUS_IN_PROGRESS)
+        translate_db = self.book_of(chapter_item).translate_db
+        translate_db.update_status(chapter_item, translate_db.STATUS_IN_PROGRESS)
 
         # try:
         translated_result = self.process_xhtml(chapter_item, self.tags_to_translate)
 
         if isinstance(translated_result, dict) and "error" in translated_result:
             self.logger.error(f"Failed to translate '{chapter_item}': {translated_result['error']}")
-            EPUBTranslator.translate_db.update_status(chapter_item, EPUBTranslator.translate_db.STATUS_ERROR,
-                                                      translated_result['error'])
+            translate_db.update_status(chapter_item, translate_db.STATUS_ERROR, translated_result['error'])
         else:
-            EPUBTranslator.translate_db.update_status(chapter_item, EPUBTranslator.translate_db.STATUS_COMPLETED)
+            translate_db.update_status(chapter_item, translate_db.STATUS_COMPLETED)
+            # 章节已写回，不再需要文本段日志
+            translate_db.delete_segments(chapter_item)
             self.logger.info(f"Finished translation for chapter {chapter_item}")
 
-    def translate_with_delay(self, chapter_item, index, log_queue):
+    def load_segment_journal(self, chapter_item):
+        """从状态数据库读取章节上次中断前已完成的文本段"""
+        return self.book_of(chapter_item).translate_db.get_segments(chapter_item)
 
-        log_queue.put(f"Starting translation for chapter {chapter_item} use delay method")
+    def save_segment_journal(self, chapter_item, segments):
+        """把已完成的文本段批量写入状态数据库"""
+        self.book_of(chapter_item).translate_db.insert_segments(chapter_item, segments)
 
-        # 检测文档是否已翻译
+    def translate_with_delay(self, chapter_item, index, log_queue):
 
-        with open(chapter_item, 'r', encoding='utf-8') as file:
-            chapter_text = file.read()
+        log_queue.put(f"Starting translation for chapter {chapter_item} use delay method")
 
-        if contains_language(chapter_text, self.dest_lang):
-            self.logger.info(f"The chapter {chapter_item} seems to be translated already.")
-            EPUBTranslator.translate_db.update_status(chapter_item, EPUBTranslator.translate_db.STATUS_COMPLETED)
-        else:
-            # 翻译章节
-            self.translate_chapter(chapter_item)
-            # 添加随机等待时间，范围在1到5秒之间
-            wait_time = random.uniform(1, 5)
-            log_queue.put(f"Waiting for {wait_time:.2f} seconds after translating chapter {index + 1}")
+        # 翻译章节（章节是否已翻译在解析时按文本节点中目标语言文字的比例检测，已翻译的章节不发送请求）
+        self.translate_chapter(chapter_item)
+        # 后端健康时直接处理下一章，出现限流、超时或延迟上升时才按压力等待
+        wait_time = self.pacing_delay()
+        if wait_time > 0:
+            log_queue.put(f"Backend under pressure, waiting for {wait_time:.2f} seconds "
+                          f"after translating chapter {index + 1}")
             time.sleep(wait_time)
 
     @staticmethod
@@ -178,15 +314,31 @@ class EPUBTranslator(XHTMLTranslator):
         6. 从临时目录创建新的 EPUB 文件。
         7. 成功翻译之后，删除临时目录
         """
-        base_name = os.path.splitext(epub_path)[0]
-        epub_extracted_path = f"{base_name}_translated"
+        book = BookContext(epub_path)
+        try:
+            return self._process_book(book)
+        finally:
+            self.unregister_book(book)
+            self.segment_dedup.release(book)
+            book.close()
+
+    def _process_book(self, book):
+        epub_path = book.epub_path
+        epub_extracted_path = book.work_dir
+
+        if self.in_archive:
+            book.open_source_archive()
 
         def initial_work_dir(tmp_path):
             # 创建新的输出目录
             os.makedirs(tmp_path, exist_ok=True)  # exist_ok=True，确保如果目录已存在不会抛出异常
 
-            EPUBTranslator.extract_epub(epub_path, tmp_path)
-            xhtml_files = EPUBTranslator.find_xhtml_files(tmp_path)
+            if self.in_archive:
+                # 不解压，章节路径指向工作目录中翻译后保存的位置
+                xhtml_files = [member_path(tmp_path, name) for name in list_xhtml_members(book.source_archive)]
+            else:
+                EPUBTranslator.extract_epub(epub_path, tmp_path)
+                xhtml_files = EPUBTranslator.find_xhtml_files(tmp_path)
 
             # self.logger.debug(f"xhtml_files: {xhtml_files}")
             self.logger.debug(f"Extracted {len(xhtml_files)} xhtml files")
@@ -199,17 +351,14 @@ class EPUBTranslator(XHTMLTranslator):
 
             # 创建 SQLite 数据库
             try:
-                self.initialize_db(db_name='translation_status.db',
-                                   db_directory=epub_extracted_path)
-                EPUBTranslator.translate_db.create_tables()
+                book.translate_db = self.initialize_db(db_name='translation_status.db',
+                                                       db_directory=epub_extracted_path)
             except Exception as db_e:
                 self.logger.error(f"Error Create db : {db_e}")
 
             try:
-                # 把所有章节路径写入数据库
-                for chapter_path in chapters:
-                    # 尝试使用 utf-8 编码插入数据
-                    EPUBTranslator.translate_db.insert_status(chapter_path, EPUBTranslator.translate_db.STATUS_PENDING)
+                # 把所有章节路径在一个事务中写入数据库
+                book.translate_db.insert_statuses(chapters, book.translate_db.STATUS_PENDING)
             except Exception as db_e:
                 self.logger.error(f"Error insert chapter translation status: {db_e}")
 
@@ -217,25 +366,20 @@ class EPUBTranslator(XHTMLTranslator):
 
         # 检查输出目录是否存在
         if os.path.exists(epub_extracted_path):
-            # # 提示用户确认是否删除
-            # confirm = input(f"The directory '{epub_extracted_path}' already exists. Do you want to delete it? (y/n): ")
-            # if confirm.lower() == 'y':
-            #     shutil.rmtree(epub_extracted_path)  # 直接删除目录及其所有内容
-            #
-            #     # 初始化
-            #     initial_work_dir(epub_extracted_path)
-            # else:
-            #     self.logger.info(f"use the exist Directory and DB")
-            #     EPUBTranslator.initialize_db(db_name='translation_status.db', db_directory=epub_extracted_path)
             self.logger.info(f"use the exist Directory and DB")
-            EPUBTranslator.initialize_db(db_name='translation_status.db', db_directory=epub_extracted_path)
-
+            book.translate_db = self.initialize_db(db_name='translation_status.db', db_directory=epub_extracted_path)
         else:
             self.logger.info(f"extract epub to the Directory and create DB.")
             initial_work_dir(epub_extracted_path)
 
-        chapters_not_complete = EPUBTranslator.translate_db.get_chapters_not_completed()
+        if book.translate_db is None:
+            return False
+
+        chapters_not_complete = book.translate_db.get_chapters_not_completed()
         self.logger.debug(f"chapters_not_complete: {chapters_not_complete}")
+        self.register_chapters(book, chapters_not_complete)
+        # 最长作业优先：工作量大的章节先开始，避免最后只剩一个大章节在翻译
+        chapters_not_complete = self.plan_chapters(book, chapters_not_complete)
 
         total_chapters = len(chapters_not_complete)
         self.logger.info(f"Total chapters that need to be translate: {total_chapters}")
@@ -274,18 +418,19 @@ class EPUBTranslator(XHTMLTranslator):
         listener_thread.join()  # 等待监听线程结束
 
         # 再检查一次未翻译章节
-        chapters_not_complete = EPUBTranslator.translate_db.get_chapters_not_completed()
+        chapters_not_complete = book.translate_db.get_chapters_not_completed()
 
         if len(chapters_not_complete) == 0:
             self.logger.info(f"恭喜全部章节翻译完成！")
-            self.create_epub_from_directory(epub_extracted_path, f"{base_name}_translated.epub")
+            book.close_source_archive()
+            self.create_epub_from_directory(epub_extracted_path, book.output_file, epub_path)
 
             # 清理临时目录
             try:
                 self.logger.debug(f"开始清理临时目录")
 
                 # 关闭数据库链接
-                EPUBTranslator.translate_db.close_all_connections()
+                book.translate_db.close_all_connections()
 
                 # 删除目录
                 shutil.rmtree(epub_extracted_path)
@@ -302,16 +447,54 @@ class EPUBTranslator(XHTMLTranslator):
 
             return False
 
+    def translate_book(self, epub_path):
+        """处理一本书，异常时记录日志并视为失败"""
+        self.logger.debug(f"Processing EPUB file: {epub_path}")
+        try:
+            result = self.process_epub(epub_path)
+        except Exception as e:
+            self.logger.error(f"Error processing epub file {epub_path}: {e}")
+            result = False
+        if result:
+            self.logger.info(f'epub file {epub_path} has been translated')
+        else:
+            self.logger.critical(f'epub file {epub_path} has not been translated, '
+                                 f'please run the program again to fix it !')
+        return result
+
     def translate(self):
-        for epub_path in self.file_paths:
-            self.logger.debug(f"Processing EPUB file: {epub_path}")
-            if self.process_epub(epub_path):
-                self.logger.info(f'epub file {epub_path} has been translated')
-                return True
+        """翻译所有书籍：max_books 本同时处理，全部成功时返回 True"""
+        # 去重登记表按书划分，每本书处理完时释放
+        self.segment_dedup.reset()
+        results = {}
+        try:
+            if self.max_books == 1 or len(self.file_paths) <= 1:
+                for epub_path in self.file_paths:
+                    results[epub_path] = self.translate_book(epub_path)
             else:
-                self.logger.critical(f'epub file {epub_path} has not been translated, '
-                                     f'please run the program again to fix it !')
-                return False
+                with ThreadPoolExecutor(max_workers=self.max_books) as executor:
+                    futures = {executor.submit(self.translate_book, epub_path): epub_path
+                               for epub_path in self.file_paths}
+                    for future in as_completed(futures):
+                        results[futures[future]] = future.result()
+        finally:
+            # 释放共享的翻译线程池、翻译接口实例、HTTP 连接池和异步引擎
+            self.close_segment_executor()
+            self.close_parse_pool()
+            self.close_backends()
+            close_sessions()
+            self.close_async_engine()
+            self.close_translation_memory()
+
+        if len(results) > 1:
+            # 按输入顺序汇总每本书的结果
+            for epub_path in self.file_paths:
+                status = "translated" if results.get(epub_path) else "NOT translated"
+                self.logger.info(f"{status}: {epub_path}")
+            self.logger.info(f"{sum(1 for result in results.values() if result)} of {len(results)} "
+                             f"epub files have been translated")
+        self.book_results = results
+        return all(results.get(epub_path, False) for epub_path in self.file_paths)
 
 
 class ConfigLoader:
@@ -344,6 +527,24 @@ class ConfigLoader:
                 'TranslateThreadWorkers': self.config.getint('Translation', 'TranslateThreadWorkers',
                                                              fallback=self.args.TranslateThreadWorkers),
                 'processes': self.config.getint('Translation', 'processes', fallback=self.args.processes),
+                'batch_max_chars': self.config.getint('Translation', 'batch_max_chars',
+                                                      fallback=self.args.batch_max_chars),
+                'translation_memory_path': self.config.get('Translation', 'translation_memory_path',
+                                                           fallback=self.args.translation_memory_path),
+                'translation_memory_lru_size': self.config.getint('Translation', 'translation_memory_lru_size',
+                                                                  fallback=self.args.translation_memory_lru_size),
+                'concurrency_mode': self.config.get('Translation', 'concurrency_mode',
+                                                    fallback=self.args.concurrency_mode),
+                'async_max_concurrency': self.config.getint('Translation', 'async_max_concurrency',
+                                                            fallback=self.args.async_max_concurrency),
+                'async_per_host_limit': self.config.getint('Translation', 'async_per_host_limit',
+                                                           fallback=self.args.async_per_host_limit),
+                'rate_limits': {
+                    'google': (self.config.getfloat('RateLimit', 'google_rate', fallback=self.args.google_rate),
+                               self.config.getint('RateLimit', 'google_burst', fallback=self.args.google_burst)),
+                    'zhipu': (self.config.getfloat('RateLimit', 'zhipu_rate', fallback=self.args.zhipu_rate),
+                              self.config.getint('RateLimit', 'zhipu_burst', fallback=self.args.zhipu_burst)),
+                },
                 'log_file': self.config.get('Logger', 'log_file', fallback=self.args.log_file),
                 'log_level': self.config.get('Logger', 'log_level', fallback=self.args.log_level),
                 # 'file_paths': self.args.file_paths
@@ -354,7 +555,19 @@ class ConfigLoader:
                 ],
                 'translator_api': self.config.get('ZhiPuAI', 'translator_api', fallback=self.args.translator_api),
                 'zhipu_api_key': self.config.get('ZhiPuAI', 'zhipu_api_key', fallback=self.args.zhipu_api_key),
-                'zhipu_translate_timeout': self.config.getint('ZhiPuAI', 'zhipu_translate_timeout', fallback=self.args.zhipu_translate_timeout)
+                'zhipu_translate_timeout': self.config.getint('ZhiPuAI', 'zhipu_translate_timeout', fallback=self.args.zhipu_translate_timeout),
+                'zhipu_call_mode': self.config.get('ZhiPuAI', 'zhipu_call_mode', fallback=self.args.zhipu_call_mode),
+                'in_archive': self.config.getboolean('Translation', 'in_archive', fallback=self.args.in_archive),
+                'compress_level': self.config.getint('Translation', 'compress_level', fallback=self.args.compress_level),
+                'xhtml_parser': self.config.get('Translation', 'xhtml_parser', fallback=self.args.xhtml_parser),
+                'source_lang': self.config.get('Translation', 'source_lang', fallback=self.args.source_lang),
+                'max_books': self.config.getint('Translation', 'max_books', fallback=self.args.max_books),
+                'parse_processes': self.config.getint('Translation', 'parse_processes',
+                                                      fallback=self.args.parse_processes),
+                'translated_ratio': self.config.getfloat('Translation', 'translated_ratio',
+                                                         fallback=self.args.translated_ratio),
+                'zhipu_batch_max_tokens': self.config.getint('ZhiPuAI', 'zhipu_batch_max_tokens',
+                                                             fallback=self.args.zhipu_batch_max_tokens)
             }
 
             # 如果需要处理文件路径为原始字符串，可以在这里进行转换
@@ -378,8 +591,40 @@ def main():
     parser.add_argument('--dest_lang', type=str, help='目标语言（例如：zh-cn）')
     parser.add_argument('--transMode', type=int, choices=[1, 2], default=1,
                         help='翻译模式（1: 仅翻译文本，2: 返回原文+翻译文本）')
-    parser.add_argument('--TranslateThreadWorkers', type=int, default=16, help='翻译线程工作数（默认16）')
-    parser.add_argument('--processes', type=int, default=4, help='epub章节并行处理进程数（默认4）')
+    parser.add_argument('--TranslateThreadWorkers', type=int, default=16, help='所有章节共享的翻译线程数，即同时进行的翻译请求数上限（默认16）')
+    parser.add_argument('--processes', type=int, default=4, help='同时解析、替换和写回的章节数（默认4），不影响翻译请求并发数')
+    parser.add_argument('--batch_max_chars', type=int, default=4500,
+                        help='谷歌批量翻译每个请求的最大字符数，0 表示逐段翻译（默认4500）')
+    parser.add_argument('--translation_memory_path', type=str, default=None,
+                        help='翻译记忆库文件路径，跨章节、书籍和多次运行共享，不设置表示不启用')
+    parser.add_argument('--translation_memory_lru_size', type=int, default=10000,
+                        help='翻译记忆库进程内 LRU 缓存条目数（默认10000）')
+    parser.add_argument('--concurrency_mode', type=str, choices=['thread', 'asyncio'], default='thread',
+                        help='并发模式（thread: 所有章节共享的翻译线程池，线程数即 TranslateThreadWorkers；asyncio: 所有章节共享的异步引擎）')
+    parser.add_argument('--async_max_concurrency', type=int, default=64,
+                        help='asyncio 模式下全局同时进行的请求数上限（默认64）')
+    parser.add_argument('--async_per_host_limit', type=int, default=8,
+                        help='asyncio 模式下每个主机同时进行的请求数上限（默认8）')
+    parser.add_argument('--in_archive', action='store_true',
+                        help='压缩包内处理：不解压 EPUB，直接读取章节，组装时原样复制未修改的成员')
+    parser.add_argument('--compress_level', type=int, default=6, choices=range(10), metavar='0-9',
+                        help='组装译本时的压缩级别，越小越快、文件越大（默认6）')
+    parser.add_argument('--source_lang', type=str, default='auto',
+                        help='源语言（例如：en、ru、ja），只翻译包含该语言文字的文本；auto 表示翻译所有包含字母的文本（默认auto）')
+    parser.add_argument('--max_books', type=int, default=1,
+                        help='同时处理的 EPUB 文件数，所有书共享翻译请求并发、翻译记忆和连接池（默认1）')
+    parser.add_argument('--parse_processes', type=int, default=0,
+                        help='章节解析、回填和序列化使用的进程数，0 表示在章节线程中完成（默认0）')
+    parser.add_argument('--translated_ratio', type=float, default=0.9,
+                        help='章节文本中目标语言文字占比达到该值时视为已翻译并跳过（默认0.9）')
+    parser.add_argument('--xhtml_parser', type=str, default='auto', choices=['auto', 'lxml', 'html.parser'],
+                        help='章节解析器：auto 优先使用 lxml，章节不是合法 XML 时退回 html.parser（默认auto）')
+    parser.add_argument('--google_rate', type=float, default=5,
+                        help='每个谷歌域名后缀每秒请求数上限，0 表示不限速（默认5）')
+    parser.add_argument('--google_burst', type=int, default=10, help='每个谷歌域名后缀允许的突发请求数（默认10）')
+    parser.add_argument('--zhipu_rate', type=float, default=5,
+                        help='每个智谱 API Key 每秒请求数上限，0 表示不限速（默认5）')
+    parser.add_argument('--zhipu_burst', type=int, default=10, help='每个智谱 API Key 允许的突发请求数（默认10）')
     parser.add_argument('--log_file', type=str, default='app.log', help='日志文件路径（默认: app.log）')
     parser.add_argument('--log_level', type=str, default='INFO', help='Log '
                                                                       'level (DEBUG, INFO, WARNING, ERROR, CRITICAL).')
@@ -390,6 +635,10 @@ def main():
                         help='Translate API, support google and zhipuAI')
     parser.add_argument('--zhipu_api_key', type=str, help='ZhiPu API key.')
     parser.add_argument('--zhipu_translate_timeout', type=int, help='ZhiPu translate timeout.')
+    parser.add_argument('--zhipu_call_mode', type=str, default='sync', choices=['sync', 'stream', 'async'],
+                        help='智谱接口调用方式：sync 直接返回，stream 流式返回，async 提交异步任务后轮询（默认 sync）')
+    parser.add_argument('--zhipu_batch_max_tokens', type=int, default=1500,
+                        help='智谱多段打包翻译时每个提示词的原文 token 预算，0 表示逐段翻译（默认1500）')
 
     # 首先解析命令行参数
     args = parser.parse_args()
@@ -431,8 +680,24 @@ def main():
         config['TranslateThreadWorkers'],  # 确保传递翻译线程工作数
         tags_to_translate=config['tags_to_translate'],
         translator_api=config['translator_api'],
+        batch_max_chars=config['batch_max_chars'],
+        translation_memory_path=config['translation_memory_path'],
+        translation_memory_lru_size=config['translation_memory_lru_size'],
+        concurrency_mode=config['concurrency_mode'],
+        async_max_concurrency=config['async_max_concurrency'],
+        async_per_host_limit=config['async_per_host_limit'],
+        rate_limits=config['rate_limits'],
+        zhipu_batch_max_tokens=config['zhipu_batch_max_tokens'],
+        in_archive=config['in_archive'],
+        compress_level=config['compress_level'],
+        xhtml_parser=config['xhtml_parser'],
+        source_lang=config['source_lang'],
+        translated_ratio=config['translated_ratio'],
+        parse_processes=config['parse_processes'],
+        max_books=config['max_books'],
         zhipu_api_key=config['zhipu_api_key'],
-        zhipu_translate_timeout=config['zhipu_translate_timeout']
+        zhipu_translate_timeout=config['zhipu_translate_timeout'],
+        zhipu_call_mode=config['zhipu_call_mode']
     )
 
     # 进行翻译
@@ -0,0 +1,270 @@
+"""
+EPUB 压缩包工具：直接从源 EPUB 读取章节；组装译本时只压缩有变化的成员，其余成员原样复制压缩数据，不解压也不重新压缩。
+"""
+import fnmatch
+import logging
+import os
+import posixpath
+import shutil
+import struct
+import sys
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+# 需要翻译的章节文件扩展名
+XHTML_PATTERNS = ('*.html', '*.xhtml', '*.htm')
+
+# 本地文件头（固定 30 字节）及其中文件名长度、扩展字段长度的位置
+_LOCAL_HEADER = struct.Struct(zipfile.structFileHeader)
+_LOCAL_HEADER_SIGNATURE = zipfile.stringFileHeader
+_LOCAL_HEADER_NAME_LENGTH = 10
+_LOCAL_HEADER_EXTRA_LENGTH = 11
+
+# 通用标志位：压缩数据后带数据描述符
+_FLAG_DATA_DESCRIPTOR = 0x08
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+# 默认压缩级别，与 zipfile 一致
+DEFAULT_COMPRESS_LEVEL = zlib.Z_DEFAULT_COMPRESSION
+
+# 直接写入已压缩数据依赖的 ZipFile 内部状态，只在确认过内部结构的 CPython 版本上使用
+_RAW_WRITE_VERSIONS = ((3, 8), (3, 14))
+_RAW_WRITE_ATTRIBUTES = ('_lock', '_writing', '_didModify', '_writecheck', 'fp', 'start_dir', 'filelist', 'NameToInfo')
+
+
+def list_xhtml_members(zip_ref):
+    """返回压缩包中所有章节文件（html/xhtml/htm）的成员名"""
+    members = []
+    for info in zip_ref.infolist():
+        if info.is_dir():
+            continue
+        filename = posixpath.basename(info.filename)
+        if any(fnmatch.fnmatch(filename, pattern) for pattern in XHTML_PATTERNS):
+            members.append(info.filename)
+    return members
+
+
+def member_path(work_dir, member_name):
+    """成员在工作目录中对应的本地路径，拒绝指向工作目录之外的成员名"""
+    work_dir = os.path.abspath(work_dir)
+    path = os.path.abspath(os.path.join(work_dir, *member_name.split('/')))
+    if os.path.commonpath([work_dir, path]) != work_dir:
+        raise ValueError(f"Unsafe member name in archive: {member_name}")
+    return path
+
+
+def member_name(work_dir, path):
+    """member_path 的逆运算：本地路径对应的成员名"""
+    return os.path.relpath(path, work_dir).replace(os.sep, '/')
+
+
+def raw_write_supported(zip_out):
+    """当前 Python 的 ZipFile 是否可以直接写入已压缩数据（版本已确认且内部状态都存在）
+
+    不支持时组装译本退回公开接口：变化的成员用 ZipFile.open(zinfo, 'w') 写入，未变化的成员解压后重新压缩。
+    """
+    low, high = _RAW_WRITE_VERSIONS
+    return low <= sys.version_info[:2] < high and all(hasattr(zip_out, name) for name in _RAW_WRITE_ATTRIBUTES)
+
+
+def _write_entry(zip_out, zinfo, chunks):
+    """写入一个已压缩的成员：zinfo 中的 CRC 和大小必须已经填好
+
+    ZipFile 没有写入已压缩数据的公开接口，这里按 writestr 的方式直接维护其内部状态，
+    只能在 raw_write_supported 为 True 时调用。
+    """
+    with zip_out._lock:
+        if zip_out._writing:
+            raise ValueError("Can't write to the ZIP file while there is another write handle open on it.")
+        zip_out.fp.seek(zip_out.start_dir)
+        zinfo.header_offset = zip_out.fp.tell()
+        zip_out._writecheck(zinfo)
+        zip_out._didModify = True
+        zip_out.fp.write(zinfo.FileHeader())
+        for chunk in chunks:
+            zip_out.fp.write(chunk)
+        zip_out.filelist.append(zinfo)
+        zip_out.NameToInfo[zinfo.filename] = zinfo
+        zip_out.start_dir = zip_out.fp.tell()
+
+
+def _read_raw_chunks(raw_file, info):
+    remaining = info.compress_size
+    while remaining > 0:
+        chunk = raw_file.read(min(_COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated data for member {info.filename}")
+        yield chunk
+        remaining -= len(chunk)
+
+
+def _copy_info(info):
+    """复制源成员的元数据，生成写入目标压缩包用的 ZipInfo"""
+    zinfo = zipfile.ZipInfo(info.filename, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.comment = info.comment
+    zinfo.create_system = info.create_system
+    zinfo.external_attr = info.external_attr
+    zinfo.internal_attr = info.internal_attr
+    return zinfo
+
+
+def copy_member(zip_ref, info, zip_out):
+    """通过公开接口复制一个成员：解压后按原压缩方式重新写入"""
+    if info.is_dir():
+        zip_out.writestr(_copy_info(info), b'')
+        return
+    with zip_ref.open(info) as source, zip_out.open(_copy_info(info), 'w') as target:
+        shutil.copyfileobj(source, target, _COPY_CHUNK_SIZE)
+
+
+def write_file(zip_out, path, name):
+    """通过公开接口把本地文件压缩写入目标压缩包"""
+    zinfo = zipfile.ZipInfo.from_file(path, name)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    with open(path, 'rb') as source, zip_out.open(zinfo, 'w') as target:
+        shutil.copyfileobj(source, target, _COPY_CHUNK_SIZE)
+
+
+def copy_raw_member(raw_file, info, zip_out):
+    """把源压缩包中一个成员的压缩数据原样写入目标压缩包
+
+    :param raw_file: 以二进制方式打开的源压缩包文件对象
+    :param info: 源压缩包中该成员的 ZipInfo（CRC、大小取自中央目录）
+    :param zip_out: 以写模式打开的目标 ZipFile
+    """
+    raw_file.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(raw_file.read(_LOCAL_HEADER.size))
+    if header[0] != _LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f"Bad local file header for member {info.filename}")
+    raw_file.seek(header[_LOCAL_HEADER_NAME_LENGTH] + header[_LOCAL_HEADER_EXTRA_LENGTH], os.SEEK_CUR)
+
+    zinfo = _copy_info(info)
+    # CRC 和大小已知，新的本地文件头直接写入，不再需要数据描述符
+    zinfo.flag_bits = info.flag_bits & ~_FLAG_DATA_DESCRIPTOR
+    zinfo.CRC = info.CRC
+    zinfo.compress_size = info.compress_size
+    zinfo.file_size = info.file_size
+    _write_entry(zip_out, zinfo, _read_raw_chunks(raw_file, info))
+
+
+def compress_file(path, name, compress_level=DEFAULT_COMPRESS_LEVEL):
+    """读取并压缩一个文件（zlib 压缩期间释放 GIL，可以在线程池中并行执行）
+
+    :return: (填好 CRC 和大小的 ZipInfo, 压缩后的数据)
+    """
+    zinfo = zipfile.ZipInfo.from_file(path, name)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    with open(path, 'rb') as file:
+        data = file.read()
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    zinfo.CRC = zlib.crc32(data)
+    zinfo.file_size = len(data)
+    zinfo.compress_size = len(compressed)
+    return zinfo, compressed
+
+
+def write_mimetype(zip_ref, zip_out):
+    """写入 mimetype：必须是第一个成员且不压缩"""
+    try:
+        mimetype = zip_ref.read('mimetype')
+    except KeyError:
+        mimetype = b'application/epub+zip'
+    zip_out.writestr(zipfile.ZipInfo('mimetype', (1980, 1, 1, 0, 0, 0)), mimetype, compress_type=zipfile.ZIP_STORED)
+
+
+def file_matches_member(path, info):
+    """本地文件与压缩包成员内容是否一致（先比较大小，再比较 CRC32）"""
+    if os.path.getsize(path) != info.file_size:
+        return False
+    crc = 0
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(_COPY_CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc == info.CRC
+
+
+def _prepare_member(info, path, compress_level, precompress=True):
+    """判断源成员是否需要重新压缩：内容未变化返回 None；否则 precompress 时返回压缩结果，不预先压缩时返回本地路径"""
+    if info.is_dir() or not os.path.isfile(path) or file_matches_member(path, info):
+        return None
+    if not precompress:
+        return path
+    return compress_file(path, info.filename, compress_level)
+
+
+def repack_epub(source_epub, output_file, work_dir, exclude=(), compress_level=DEFAULT_COMPRESS_LEVEL,
+                max_workers=None):
+    """以源 EPUB 为底组装译本，只压缩内容有变化的成员
+
+    - 按源压缩包的顺序写入，mimetype 始终第一个且不压缩；
+    - 工作目录中对应文件与原成员一致（大小和 CRC 相同）或不存在时，原样复制原压缩数据；
+    - 内容有变化的成员（已翻译章节）从工作目录重新压缩写入；
+    - 工作目录中源压缩包没有的文件追加到末尾（exclude 中的文件除外）。
+
+    比较和压缩在线程池中并行进行，写入仍按顺序单线程完成。
+    当前 Python 不支持直接写入已压缩数据时（见 raw_write_supported），全部通过 ZipFile 的公开接口写入。
+
+    :param source_epub: 源 EPUB 路径
+    :param output_file: 输出 EPUB 路径
+    :param work_dir: 工作目录，目录结构与压缩包内路径一致（可以只包含部分成员）
+    :param exclude: 不写入译本的工作目录文件（相对路径），例如状态数据库
+    :param compress_level: 压缩级别，0-9，越小越快，-1 表示 zlib 默认级别
+    :param max_workers: 压缩线程数，None 表示按 CPU 数决定
+    :return: (重新压缩的成员数, 原样复制的成员数)
+    """
+    compressed = copied = 0
+    with zipfile.ZipFile(source_epub, 'r') as zip_ref, open(source_epub, 'rb') as raw_file, \
+            zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED, compresslevel=compress_level) as zip_out, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        raw_write = raw_write_supported(zip_out)
+        if not raw_write:
+            log.debug("Raw zip writes are not supported on this Python, repacking through the public API")
+        # 源压缩包成员：(源 ZipInfo, 比较/压缩任务)
+        members = [(info, executor.submit(_prepare_member, info, member_path(work_dir, info.filename),
+                                          compress_level, raw_write))
+                   for info in zip_ref.infolist() if info.filename != 'mimetype']
+
+        # 源压缩包中没有的新文件
+        known_members = set(zip_ref.NameToInfo) | set(exclude)
+        new_files = []
+        for foldername, subfolders, filenames in os.walk(work_dir):
+            for filename in sorted(filenames):
+                path = os.path.join(foldername, filename)
+                name = member_name(work_dir, path)
+                if name not in known_members:
+                    if raw_write:
+                        new_files.append(executor.submit(compress_file, path, name, compress_level))
+                    else:
+                        new_files.append((path, name))
+
+        write_mimetype(zip_ref, zip_out)
+        for info, task in members:
+            result = task.result()
+            if result is None:
+                if raw_write:
+                    copy_raw_member(raw_file, info, zip_out)
+                else:
+                    copy_member(zip_ref, info, zip_out)
+                copied += 1
+            else:
+                if raw_write:
+                    zinfo, data = result
+                    _write_entry(zip_out, zinfo, [data])
+                else:
+                    write_file(zip_out, result, info.filename)
+                compressed += 1
+        for new_file in new_files:
+            if raw_write:
+                zinfo, data = new_file.result()
+                _write_entry(zip_out, zinfo, [data])
+            else:
+                write_file(zip_out, *new_file)
+            compressed += 1
+    log.debug(f"Assembled '{output_file}': {compressed} members compressed, {copied} copied as-is")
+    return compressed, copied
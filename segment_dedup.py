@@ -0,0 +1,70 @@
+import threading
+from concurrent.futures import Future
+
+from db.translation_memory import TranslationMemory
+
+
+class SegmentDeduplicator:
+    """全书范围的文本段去重登记表。
+
+    同一规范化文本只由第一个登记它的章节（owner）发送翻译请求，
+    其他章节拿到同一个 Future 等待结果，再各自回填到所有出现的位置。
+    每本书（scope）一个登记表：成功的译文一直保留到这本书处理完（release），书内后续章节直接复用；
+    翻译失败的登记立即移除，后续章节可以重新请求。
+    """
+
+    def __init__(self):
+        self._registries = {}  # scope -> {去重键: Future}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text):
+        """计算去重键：规范化后的原文"""
+        return TranslationMemory.normalize(text)
+
+    def claim(self, text, scope=None):
+        """登记文本段。
+
+        :param text: 原文
+        :param scope: 登记表的范围（通常是所属的书），None 表示默认登记表
+        :return: (future, is_owner)，is_owner 为 True 时调用方负责翻译并调用 resolve
+        """
+        key = self.make_key(text)
+        with self._lock:
+            futures = self._registries.setdefault(scope, {})
+            future = futures.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            futures[key] = future
+            return future, True
+
+    def resolve(self, text, future, translated_text):
+        """设置 owner 登记的 Future 的结果；翻译失败时移除登记，后续章节可以重新请求
+
+        :param text: 原文
+        :param future: claim 返回的 Future
+        :param translated_text: 格式化后的译文，失败时为 None、空字符串或错误字典
+        """
+        if not translated_text or isinstance(translated_text, dict):
+            key = self.make_key(text)
+            with self._lock:
+                for futures in self._registries.values():
+                    if futures.get(key) is future:
+                        futures.pop(key)
+        if not future.done():
+            future.set_result(translated_text)
+
+    def release(self, scope=None):
+        """移除一个范围的登记表（书处理完时调用）"""
+        with self._lock:
+            self._registries.pop(scope, None)
+
+    def reset(self):
+        """清空所有登记表（开始新的一次运行时调用）"""
+        with self._lock:
+            self._registries = {}
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(futures) for futures in self._registries.values())
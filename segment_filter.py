@@ -0,0 +1,194 @@
+import re
+from functools import lru_cache
+
+from languageDetect import LANGUAGE_PATTERNS, get_language_pattern
+
+# 任意文字的字母（不含数字、下划线、标点和空白）
+LETTER_CLASS = r'[^\W\d_]'
+LETTER_PATTERN = re.compile(LETTER_CLASS)
+# 双语模式（transMode = 2）输出的文本段：“原文 [译文]”
+BILINGUAL_PATTERN = re.compile(r'(.*?\S)\s\[(.+)\]', re.DOTALL)
+# 基本多文种平面的所有字符，用于判断两种文字的字符集是否重叠
+BMP_CHARACTERS = ''.join(map(chr, range(0x10000)))
+
+# 章节检测状态
+CHAPTER_UNTRANSLATED = 'untranslated'
+CHAPTER_PARTIAL = 'partial'
+CHAPTER_TRANSLATED = 'translated'
+
+
+@lru_cache(maxsize=None)
+def scripts_overlap(pattern, other_pattern):
+    """两种文字的字符集正则是否匹配同一个字符（例如日文汉字和中文）"""
+    return re.search(f'(?={pattern}){other_pattern}', BMP_CHARACTERS) is not None
+
+
+def overlaps_other_script(lang_code):
+    """语言的文字是否与其他任何语言的文字重叠：源语言为 auto 时这样的目标文字无法判断文本来自哪种语言"""
+    pattern = LANGUAGE_PATTERNS.get(lang_code)
+    return pattern is not None and any(scripts_overlap(pattern, other_pattern)
+                                       for other_lang, other_pattern in LANGUAGE_PATTERNS.items()
+                                       if other_lang != lang_code)
+
+
+class ChapterDetection:
+    """章节翻译状态检测结果"""
+
+    def __init__(self, status, ratio, translated_segments, pending_segments, complete):
+        self.status = status
+        self.ratio = ratio  # 目标语言文字占全部字母的比例
+        self.translated_segments = translated_segments  # 已是目标语言的文本段数
+        self.pending_segments = pending_segments  # 仍需翻译的文本段数
+        self.complete = complete  # False 表示提前结束，只检查了章节的一部分
+
+    def __repr__(self):
+        return (f"<ChapterDetection(status='{self.status}', ratio={self.ratio:.2f}, "
+                f"translated={self.translated_segments}, pending={self.pending_segments}, "
+                f"complete={self.complete})>")
+
+
+class SegmentFilter:
+    """文本段分类器：判断一个文本节点是否需要翻译。
+
+    - 标签使用集合查找；
+    - 指定源语言时，文本必须包含源语言文字；
+    - 源语言为 auto 时，文本必须包含字母，目标文字不是拉丁文字、也不与其他语言的文字重叠（例如中文与日文汉字）时
+      还要求包含目标文字以外的字母（纯目标语言文本不再重复翻译）；
+    - 只有空白、数字或标点的节点一律跳过，不会成为翻译请求；
+    - 目标语言文字与源语言文字不同且不重叠时，大部分字母已是目标语言文字的节点视为已翻译，不再发送；
+      双语模式下按“原文 [译文]”中的译文部分判断。
+    是否需要翻译的判断合并为一个预编译正则，每个节点只做一次 search。
+    """
+
+    def __init__(self, tags, source_lang='auto', dest_lang=None, segment_ratio=0.5, chapter_ratio=0.9,
+                 sample_letters=2000, trans_mode=1):
+        """
+        :param tags: 需要翻译的标签名列表
+        :param source_lang: 源语言代码，auto 表示不限定源语言文字
+        :param dest_lang: 目标语言代码
+        :param segment_ratio: 文本段中目标语言文字占字母的比例达到该值时视为已翻译
+        :param chapter_ratio: 章节中目标语言文字占字母的比例达到该值时视为整章已翻译
+        :param sample_letters: 章节检测时至少检查的字母数，此后比例明显偏低即提前结束
+        :param trans_mode: 翻译模式，2 为双语模式（译文格式为“原文 [译文]”）
+        """
+        self.tags = frozenset(tag.strip() for tag in tags if tag.strip())
+        self.source_lang = source_lang
+        self.dest_lang = dest_lang
+        self.pattern = self.build_pattern(source_lang, dest_lang)
+        self.segment_ratio = segment_ratio
+        self.chapter_ratio = chapter_ratio
+        self.sample_letters = sample_letters
+        self.trans_mode = trans_mode
+
+        # 目标语言文字与源语言文字相同或有重叠（例如源语言为 auto、目标为拉丁文字，或日文汉字与中文）时
+        # 无法按文字判断是否已翻译
+        self.dest_pattern = None
+        dest_pattern = LANGUAGE_PATTERNS.get(dest_lang)
+        if dest_pattern is not None and not self.same_script(source_lang, dest_lang):
+            self.dest_pattern = re.compile(dest_pattern)
+        # 源语言为 auto 且目标文字与其他语言的文字重叠时，单个文本段（例如只有汉字的日文标题）无法判断是否已翻译，
+        # 只按双语格式和整章比例检测
+        self.segment_skip = self.dest_pattern is not None and not (self.is_auto(source_lang)
+                                                                   and overlaps_other_script(dest_lang))
+
+    @staticmethod
+    def is_auto(source_lang):
+        return not source_lang or source_lang == 'auto'
+
+    @staticmethod
+    def same_script(source_lang, dest_lang):
+        """源语言和目标语言是否使用同一种文字，或两者的字符集有重叠"""
+        dest_pattern = LANGUAGE_PATTERNS.get(dest_lang)
+        if dest_pattern is None:
+            return True
+        dest_latin = re.match(dest_pattern, 'a') is not None
+        if SegmentFilter.is_auto(source_lang):
+            return dest_latin
+        source_pattern = LANGUAGE_PATTERNS.get(source_lang)
+        if source_pattern is None:
+            return True
+        return scripts_overlap(source_pattern, dest_pattern)
+
+    @staticmethod
+    def build_pattern(source_lang='auto', dest_lang=None):
+        """构造判断文本是否需要翻译的正则"""
+        if not SegmentFilter.is_auto(source_lang):
+            return get_language_pattern(source_lang)
+
+        dest_pattern = LANGUAGE_PATTERNS.get(dest_lang)
+        if dest_pattern is None or re.match(dest_pattern, 'a') or overlaps_other_script(dest_lang):
+            # 目标语言也是拉丁文字，或目标文字与其他语言的文字重叠时，无法按文字区分源语言和目标语言
+            return re.compile(LETTER_CLASS)
+        return re.compile(f'(?!{dest_pattern}){LETTER_CLASS}')
+
+    def is_translatable(self, text):
+        """文本是否包含需要翻译的文字（已是目标语言的文本段不再翻译）"""
+        return self.pattern.search(text) is not None and not self.is_translated(text)
+
+    def count_letters(self, text):
+        """返回 (目标语言文字数, 字母总数)"""
+        return len(self.dest_pattern.findall(text)), len(LETTER_PATTERN.findall(text))
+
+    def translated_part(self, text):
+        """双语模式下“原文 [译文]”形式的文本段返回其中的译文，否则返回 None"""
+        if self.trans_mode != 2:
+            return None
+        match = BILINGUAL_PATTERN.fullmatch(text.strip())
+        return match.group(2) if match else None
+
+    def is_translated(self, text):
+        """文本段是否已经是目标语言（双语模式下为译文部分是目标语言）"""
+        if self.dest_pattern is None:
+            return False
+        translated_part = self.translated_part(text)
+        if translated_part is None:
+            if not self.segment_skip:
+                return False
+            translated_part = text
+        target_letters, letters = self.count_letters(translated_part)
+        return letters > 0 and target_letters >= letters * self.segment_ratio
+
+    def detect_chapter(self, texts):
+        """按文本节点统计章节中目标语言文字的比例，判断章节是否已翻译
+
+        判断“已翻译”需要检查整章；检查过 sample_letters 个字母后比例仍明显偏低时提前结束，
+        章节按需翻译，逐段过滤会跳过其中已经翻译的文本段。
+
+        :param texts: 章节中需要翻译的标签内的文本节点（可以是生成器）
+        :return: ChapterDetection
+        """
+        if self.dest_pattern is None:
+            return ChapterDetection(CHAPTER_UNTRANSLATED, 0.0, 0, 0, False)
+
+        target_letters = letters = translated_segments = pending_segments = 0
+        complete = True
+        for text in texts:
+            # 双语模式的文本段只统计译文部分，原文部分不计入比例
+            text = self.translated_part(text) or text
+            if self.pattern.search(text) is None and self.dest_pattern.search(text) is None:
+                continue
+            node_target, node_letters = self.count_letters(text)
+            if node_letters == 0:
+                continue
+            target_letters += node_target
+            letters += node_letters
+            if node_target >= node_letters * self.segment_ratio:
+                translated_segments += 1
+            else:
+                pending_segments += 1
+            if letters >= self.sample_letters and target_letters < letters * (1 - self.chapter_ratio):
+                complete = False
+                break
+
+        ratio = target_letters / letters if letters else 0.0
+        if letters and ratio >= self.chapter_ratio:
+            status = CHAPTER_TRANSLATED
+        elif translated_segments:
+            status = CHAPTER_PARTIAL
+        else:
+            status = CHAPTER_UNTRANSLATED
+        return ChapterDetection(status, ratio, translated_segments, pending_segments, complete)
+
+    def __repr__(self):
+        return (f"<SegmentFilter(tags={sorted(self.tags)}, source_lang='{self.source_lang}', "
+                f"pattern='{self.pattern.pattern}')>")
@@ -0,0 +1,54 @@
+import os
+import zipfile
+
+import pytest
+
+import epub_archive
+from epub_archive import member_path, repack_epub
+
+CHAPTER = b'<html><body><p>Hello</p></body></html>'
+TRANSLATED = '<html><body><p>你好</p></body></html>'
+
+
+def make_epub(path):
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('mimetype', b'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        archive.writestr('META-INF/', b'')
+        archive.writestr('OEBPS/ch1.xhtml', CHAPTER, compress_type=zipfile.ZIP_DEFLATED)
+        archive.writestr('OEBPS/ch2.xhtml', CHAPTER, compress_type=zipfile.ZIP_DEFLATED)
+        archive.writestr('OEBPS/img/a.jpg', os.urandom(4096), compress_type=zipfile.ZIP_STORED)
+
+
+@pytest.mark.parametrize('raw_write', [True, False])
+def test_repack_copies_unchanged_members_and_keeps_mimetype_first(tmp_path, monkeypatch, raw_write):
+    if not raw_write:
+        monkeypatch.setattr(epub_archive, 'raw_write_supported', lambda zip_out: False)
+    source = tmp_path / 'book.epub'
+    output = tmp_path / 'book_translated.epub'
+    work_dir = tmp_path / 'work'
+    make_epub(source)
+
+    # 工作目录只包含一个已翻译的章节、一个内容未变化的章节、一个新文件和需要排除的状态数据库
+    for name, data in (('OEBPS/ch1.xhtml', TRANSLATED.encode('utf-8')), ('OEBPS/ch2.xhtml', CHAPTER),
+                       ('OEBPS/new.css', b'p {}'), ('translation_status.db', b'db')):
+        path = member_path(str(work_dir), name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(data)
+
+    compressed, copied = repack_epub(str(source), str(output), str(work_dir), exclude=('translation_status.db',))
+
+    assert (compressed, copied) == (2, 3)
+    with zipfile.ZipFile(source) as original, zipfile.ZipFile(output) as repacked:
+        assert repacked.testzip() is None
+        infos = repacked.infolist()
+        assert infos[0].filename == 'mimetype'
+        assert infos[0].compress_type == zipfile.ZIP_STORED
+        assert repacked.read('mimetype') == b'application/epub+zip'
+        assert [info.filename for info in infos] == ['mimetype', 'META-INF/', 'OEBPS/ch1.xhtml', 'OEBPS/ch2.xhtml',
+                                                     'OEBPS/img/a.jpg', 'OEBPS/new.css']
+        assert repacked.read('OEBPS/ch1.xhtml').decode('utf-8') == TRANSLATED
+        assert repacked.read('OEBPS/ch2.xhtml') == CHAPTER
+        assert repacked.read('OEBPS/img/a.jpg') == original.read('OEBPS/img/a.jpg')
+        assert repacked.getinfo('OEBPS/img/a.jpg').compress_type == zipfile.ZIP_STORED
+        assert 'translation_status.db' not in repacked.namelist()
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from translate_api.google_translate_v2 import BATCH_SEPARATOR, google_translator
+from xhtmlTranslate import XHTMLTranslator
+
+
+def batch_response_line(raw_text):
+    """构造 batchexecute 响应中包含译文的一行"""
+    inner = [None, [[[raw_text]]]]
+    return json.dumps([["wrb.fr", "MkEWBc", json.dumps(inner), None, None, None, "generic"]])
+
+
+def test_batch_lines_are_collapsed_and_joined():
+    lines, joined = google_translator._batch_lines(["First\nsentence.", "  Second   sentence. "])
+    assert lines == ["First sentence.", "Second sentence."]
+    assert joined == BATCH_SEPARATOR.join(lines)
+
+
+def test_batch_response_is_split_in_order():
+    line = batch_response_line(BATCH_SEPARATOR.join(["第一句。", "第二句。"]))
+    assert google_translator._parse_batch_line(line, 2) == ["第一句。", "第二句。"]
+
+
+@pytest.mark.parametrize('raw_text', ["第一句。第二句。", "第一句。\n第二句。\n第三句。"])
+def test_misaligned_batch_response_returns_none(raw_text):
+    assert google_translator._parse_batch_line(batch_response_line(raw_text), 2) is None
+
+
+def test_misaligned_batch_falls_back_to_single_requests(monkeypatch):
+    single_calls = []
+
+    def fake_translate(self, text, lang_tgt='auto', lang_src='auto', pronounce=False):
+        single_calls.append(text)
+        return f"T({text})"
+
+    monkeypatch.setattr(google_translator, 'translate_batch', lambda self, texts, *args, **kwargs: None)
+    monkeypatch.setattr(google_translator, 'translate', fake_translate)
+    translator = XHTMLTranslator(None, 'com', 'zh-cn', TranslateThreadWorkers=2)
+    try:
+        results = translator.translate_batch_google(["First sentence.", "Second sentence."])
+    finally:
+        translator.close_backends()
+
+    assert results == ["T(First sentence.)", "T(Second sentence.)"]
+    assert single_calls == ["First sentence.", "Second sentence."]
@@ -0,0 +1,64 @@
+from segment_dedup import SegmentDeduplicator
+from translate_api.google_translate_v2 import google_translator
+from xhtmlTranslate import XHTMLTranslator
+
+CHAPTER = ('<?xml version="1.0" encoding="utf-8"?>'
+           '<html xmlns="http://www.w3.org/1999/xhtml"><head><title>{title}</title></head>'
+           '<body><p>Shared sentence.</p><p>{title} only.</p></body></html>')
+
+
+def test_claim_returns_the_same_future_for_normalized_text():
+    dedup = SegmentDeduplicator()
+    future, is_owner = dedup.claim("Shared  sentence.", scope='book')
+    waiting, waiting_is_owner = dedup.claim(" Shared sentence. ", scope='book')
+    assert is_owner and not waiting_is_owner
+    assert waiting is future
+
+    dedup.resolve("Shared sentence.", future, "共享的句子。")
+    assert waiting.result() == "共享的句子。"
+    # 成功的译文保留到这本书处理完
+    assert dedup.claim("Shared sentence.", scope='book') == (future, False)
+
+
+def test_failed_results_are_dropped_so_later_chapters_retry():
+    dedup = SegmentDeduplicator()
+    future, _ = dedup.claim("Shared sentence.", scope='book')
+    dedup.resolve("Shared sentence.", future, None)
+    assert future.result() is None
+    assert len(dedup) == 0
+
+    retry, is_owner = dedup.claim("Shared sentence.", scope='book')
+    assert is_owner and retry is not future
+
+
+def test_release_only_clears_its_own_scope():
+    dedup = SegmentDeduplicator()
+    dedup.claim("Shared sentence.", scope='first')
+    future, is_owner = dedup.claim("Shared sentence.", scope='second')
+    assert is_owner
+
+    dedup.release('first')
+    assert len(dedup) == 1
+    assert dedup.claim("Shared sentence.", scope='second') == (future, False)
+
+
+def test_shared_text_is_translated_once_across_chapters(monkeypatch):
+    calls = []
+
+    def fake_translate(self, text, lang_tgt='auto', lang_src='auto', pronounce=False):
+        calls.append(text)
+        return f"T({text})"
+
+    monkeypatch.setattr(google_translator, 'translate', fake_translate)
+    translator = XHTMLTranslator(None, 'com', 'zh-cn', TranslateThreadWorkers=2, tags_to_translate='title,p',
+                                 batch_max_chars=0)
+    try:
+        first = translator.translate_xhtml(CHAPTER.format(title="First"), 'first.xhtml')
+        second = translator.translate_xhtml(CHAPTER.format(title="Second"), 'second.xhtml')
+    finally:
+        translator.close_segment_executor()
+        translator.close_backends()
+
+    assert calls.count("Shared sentence.") == 1
+    assert "T(Shared sentence.)" in first and "T(Shared sentence.)" in second
+    assert "T(Second only.)" in second
@@ -0,0 +1,24 @@
+import pytest
+
+from segment_filter import CHAPTER_TRANSLATED, SegmentFilter
+
+
+@pytest.mark.parametrize('source_lang', ['auto', 'ja'])
+def test_kanji_only_text_is_translated_to_chinese(source_lang):
+    segment_filter = SegmentFilter(['p'], source_lang, 'zh-cn')
+    assert segment_filter.is_translatable('日本国憲法')
+    assert segment_filter.is_translatable('日本国憲法の制定')
+
+
+def test_text_already_in_a_distinct_target_script_is_skipped():
+    segment_filter = SegmentFilter(['p'], 'auto', 'ko')
+    assert not segment_filter.is_translatable('안녕하세요')
+    assert segment_filter.is_translatable('Hello world')
+    assert not segment_filter.is_translatable('  12, 34 ... ')
+
+
+def test_bilingual_output_is_recognised_as_translated():
+    segment_filter = SegmentFilter(['p'], 'auto', 'zh-cn', trans_mode=2)
+    texts = ['Chapter 1 [第一章]', 'Hello world [你好世界]']
+    assert not any(segment_filter.is_translatable(text) for text in texts)
+    assert segment_filter.detect_chapter(texts).status == CHAPTER_TRANSLATED
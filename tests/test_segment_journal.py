@@ -0,0 +1,72 @@
+from db.translation_status_db import TranslationStatusDB
+from translate_api.google_translate_v2 import google_translator
+from xhtmlTranslate import XHTMLTranslator
+
+CHAPTER = ('<?xml version="1.0" encoding="utf-8"?>'
+           '<html xmlns="http://www.w3.org/1999/xhtml"><head><title>Title</title></head>'
+           '<body><p>First sentence.</p><p>Second sentence.</p><p>Third sentence.</p></body></html>')
+
+
+class JournaledTranslator(XHTMLTranslator):
+    """把文本段日志写入状态数据库，与 EPUBTranslator 的做法相同"""
+
+    def __init__(self, translate_db, **kwargs):
+        super().__init__(None, 'com', 'zh-cn', TranslateThreadWorkers=2, tags_to_translate='title,p',
+                         batch_max_chars=0, **kwargs)
+        self.translate_db = translate_db
+
+    def load_segment_journal(self, chapter_item):
+        return self.translate_db.get_segments(chapter_item)
+
+    def save_segment_journal(self, chapter_item, segments):
+        self.translate_db.insert_segments(chapter_item, segments)
+
+    def run(self, chapter_item):
+        try:
+            return self.translate_xhtml(CHAPTER, chapter_item)
+        finally:
+            self.close_segment_executor()
+            self.close_backends()
+
+
+def test_segment_journal_round_trip(tmp_path):
+    translate_db = TranslationStatusDB(db_directory=str(tmp_path))
+    translate_db.create_tables()
+    chapter_item = str(tmp_path / 'OEBPS' / 'chapter.xhtml')
+    try:
+        translate_db.insert_segments(chapter_item, [('hash1', '译文一'), ('hash2', '译文二')])
+        assert translate_db.get_segments(chapter_item) == {'hash1': '译文一', 'hash2': '译文二'}
+
+        translate_db.delete_segments(chapter_item)
+        assert translate_db.get_segments(chapter_item) == {}
+    finally:
+        translate_db.close_all_connections()
+
+
+def test_resume_only_sends_segments_missing_from_the_journal(tmp_path, monkeypatch):
+    calls = []
+    failing = {"Second sentence."}
+
+    def fake_translate(self, text, lang_tgt='auto', lang_src='auto', pronounce=False):
+        calls.append(text)
+        return None if text in failing else f"T({text})"
+
+    monkeypatch.setattr(google_translator, 'translate', fake_translate)
+    translate_db = TranslationStatusDB(db_directory=str(tmp_path))
+    translate_db.create_tables()
+    chapter_item = str(tmp_path / 'chapter.xhtml')
+    try:
+        # 第一次运行：一个文本段失败，其余文本段写入日志
+        JournaledTranslator(translate_db).run(chapter_item)
+        assert len(translate_db.get_segments(chapter_item)) == 3
+
+        # 恢复运行：日志中的文本段直接回放，只重新发送失败的文本段
+        calls.clear()
+        failing.clear()
+        result = JournaledTranslator(translate_db).run(chapter_item)
+    finally:
+        translate_db.close_all_connections()
+
+    assert calls == ["Second sentence."]
+    for text in ("Title", "First sentence.", "Second sentence.", "Third sentence."):
+        assert f"T({text})" in result
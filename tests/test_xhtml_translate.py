@@ -0,0 +1,64 @@
+import pytest
+
+from xhtmlTranslate import XHTMLTranslator
+
+CHAPTER = ('<?xml version="1.0" encoding="utf-8"?>'
+           '<html xmlns="http://www.w3.org/1999/xhtml"><head><title>Title</title></head>'
+           '<body><p>First sentence.</p><p>Second sentence.</p><p>First sentence.</p></body></html>')
+
+
+def make_translator(**kwargs):
+    return XHTMLTranslator(None, 'com', 'zh-cn', TranslateThreadWorkers=2, tags_to_translate='title,p', **kwargs)
+
+
+def record_claims(translator):
+    """记录章节登记的所有 (Future, 是否 owner)"""
+    claims = []
+    claim = translator.segment_dedup.claim
+
+    def recording_claim(text, scope=None):
+        future, is_owner = claim(text, scope)
+        claims.append((future, is_owner))
+        return future, is_owner
+
+    translator.segment_dedup.claim = recording_claim
+    return claims
+
+
+@pytest.mark.parametrize('batch_max_chars', [0, 4500])
+def test_unsubmitted_segments_are_resolved_when_submission_fails(batch_max_chars):
+    translator = make_translator(batch_max_chars=batch_max_chars)
+    claims = record_claims(translator)
+
+    def failing_submit(*args, **kwargs):
+        raise RuntimeError("cannot schedule new futures after shutdown")
+
+    translator.submit_translation = failing_submit
+    with pytest.raises(RuntimeError):
+        translator.translate_xhtml(CHAPTER, 'chapter.xhtml')
+
+    owned = [future for future, is_owner in claims if is_owner]
+    assert owned
+    # 等待这些文本段的其他章节会拿到失败结果，而不是永远阻塞
+    for future in owned:
+        assert future.done()
+        assert future.result(timeout=0) is None
+    # 失败的登记被移除，后续章节可以重新请求
+    assert len(translator.segment_dedup) == 0
+    assert translator.segment_dedup.claim('Title')[1] is True
+
+
+def test_translation_memory_is_disabled_without_path():
+    translator = make_translator()
+    assert translator.get_translation_memory() is None
+    assert translator.lookup_memory("First sentence.") is None
+
+
+def test_translation_memory_reopens_after_close(tmp_path):
+    translator = make_translator(translation_memory_path=str(tmp_path / 'memory.db'))
+    translator.store_memory([("First sentence.", "第一句。")])
+    translator.close_translation_memory()
+
+    # 关闭后（例如 translate() 结束时）再次使用会重新打开，已保存的译文仍然可用
+    assert translator.lookup_memory("First sentence.") == "第一句。"
+    translator.close_translation_memory()
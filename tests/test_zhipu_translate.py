@@ -0,0 +1,75 @@
+import pytest
+
+from translate_api.zhipuai_translate_v1 import ZhipuAiTranslate
+from xhtmlTranslate import XHTMLTranslator
+
+
+def test_batch_content_is_numbered_one_line_per_text():
+    content = ZhipuAiTranslate._build_batch_content(["First\nsentence.", "Second sentence."])
+    assert content == "[1] First sentence.\n[2] Second sentence."
+
+
+def test_batch_reply_is_split_by_number():
+    reply = "[2] 第二句。\n[1] 第一句。\n[3] 第三句。"
+    assert ZhipuAiTranslate._parse_batch_reply(reply, 3) == ["第一句。", "第二句。", "第三句。"]
+
+
+@pytest.mark.parametrize('reply, expected', [
+    # 缺少编号的段落未对齐
+    ("[1] 第一句。\n[3] 第三句。", ["第一句。", None, "第三句。"]),
+    # 超出范围的编号被忽略
+    ("[1] 第一句。\n[2] 第二句。\n[4] 多出的一句。", ["第一句。", "第二句。", None]),
+    # 同一编号出现多次时该段按未对齐处理
+    ("[1] 第一句。\n[2] 第二句。\n[2] 重复的一句。\n[3] 第三句。", ["第一句。", None, "第三句。"]),
+])
+def test_mismatched_batch_reply_marks_missing_items(reply, expected):
+    assert ZhipuAiTranslate._parse_batch_reply(reply, 3) == expected
+
+
+@pytest.mark.parametrize('reply', ["", "智谱API error: 429", "第一句。第二句。"])
+def test_unusable_batch_reply_returns_none(reply):
+    assert ZhipuAiTranslate._parse_batch_reply(reply, 2) is None
+
+
+class FakeZhipu:
+    """按预设回复返回结果的翻译接口"""
+
+    def __init__(self, batch_replies):
+        self.batch_replies = batch_replies
+        self.batches = []
+        self.singles = []
+
+    def translate_batch(self, texts, target_language):
+        self.batches.append(texts)
+        return ZhipuAiTranslate._parse_batch_reply(self.batch_replies.pop(0), len(texts))
+
+    def translate(self, text, target_language):
+        self.singles.append(text)
+        return f"T({text})"
+
+
+def make_translator(fake):
+    translator = XHTMLTranslator(None, 'com', 'zh-cn', TranslateThreadWorkers=2, translator_api='zhipu',
+                                 zhipu_api_key='key')
+    translator.get_translator = lambda: fake
+    return translator
+
+
+def test_batch_retries_only_missing_items():
+    texts = ["First.", "Second.", "Third.", "Fourth."]
+    fake = FakeZhipu(["[1] 一。\n[3] 三。\n[4] 四。"])
+    results = make_translator(fake).translate_batch_common(texts)
+
+    assert results == ["一。", "T(Second.)", "三。", "四。"]
+    assert fake.batches == [texts]
+    assert fake.singles == ["Second."]
+
+
+def test_unusable_batch_is_split_in_half():
+    texts = ["First.", "Second.", "Third.", "Fourth."]
+    fake = FakeZhipu(["no numbers here", "[1] 一。\n[2] 二。", "[1] 三。\n[2] 四。"])
+    results = make_translator(fake).translate_batch_common(texts)
+
+    assert results == ["一。", "二。", "三。", "四。"]
+    assert fake.batches == [texts, texts[:2], texts[2:]]
+    assert fake.singles == []
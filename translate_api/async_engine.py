@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+log = logging.getLogger(__name__)
+
+
+class AsyncTranslateEngine:
+    """基于 asyncio 的翻译引擎。
+
+    在一个后台线程中运行事件循环，所有章节线程通过 submit() 提交协程并拿到
+    concurrent.futures.Future。并发由一个全局上限和每个主机的上限控制，
+    谷歌请求等待网络期间不占用操作系统线程。
+    只有同步接口的后端（智谱 SDK，以及没有异步方法的翻译器）通过 asyncio.to_thread 在事件循环的默认线程池中执行，
+    该线程池的线程数等于 max_concurrency，与全局并发上限一致，每个进行中的此类请求占用一个线程。
+    """
+
+    def __init__(self, max_concurrency=64, per_host_limit=8, http_proxy=None):
+        """初始化并启动事件循环线程。
+
+        :param max_concurrency: 全局同时进行的请求数上限
+        :param per_host_limit: 每个主机同时进行的请求数上限
+        :param http_proxy: HTTP 代理地址
+        """
+        if httpx is None:
+            raise RuntimeError("The asyncio engine requires httpx, please run: pip install httpx")
+
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.http_proxy = http_proxy
+
+        self.loop = asyncio.new_event_loop()
+        # asyncio.to_thread 使用的默认线程池，大小与全局并发上限一致（默认大小为 min(32, CPU 数 + 4)）
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="AsyncTranslateBlocking")
+        self.loop.set_default_executor(self._executor)
+        self._thread = threading.Thread(target=self._run_loop, name="AsyncTranslateEngine", daemon=True)
+        self._thread.start()
+
+        # 信号量和 HTTP 客户端必须在事件循环线程中创建
+        asyncio.run_coroutine_threadsafe(self._setup(), self.loop).result()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _setup(self):
+        self._global_limit = asyncio.Semaphore(self.max_concurrency)
+        self._host_limits = {}
+        limits = httpx.Limits(max_connections=self.max_concurrency,
+                              max_keepalive_connections=self.max_concurrency)
+        client_kwargs = {'verify': False, 'limits': limits}
+        if self.http_proxy:
+            client_kwargs['proxy'] = self.http_proxy
+        try:
+            self.client = httpx.AsyncClient(**client_kwargs)
+        except TypeError:
+            # 旧版 httpx 使用 proxies 参数
+            client_kwargs['proxies'] = client_kwargs.pop('proxy')
+            self.client = httpx.AsyncClient(**client_kwargs)
+
+    @asynccontextmanager
+    async def limit(self, host):
+        """同时受全局上限和主机上限约束的并发槽位"""
+        host_limit = self._host_limits.get(host)
+        if host_limit is None:
+            host_limit = self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        async with self._global_limit:
+            async with host_limit:
+                yield
+
+    def submit(self, coro):
+        """从任意线程提交协程，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def close(self):
+        """关闭 HTTP 客户端并停止事件循环"""
+        if not self.loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.client.aclose(), self.loop).result(timeout=10)
+        except Exception as e:
+            log.debug(f"Error closing async http client: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=10)
+        self.loop.close()
+        self._executor.shutdown(wait=False)
+
+    def __repr__(self):
+        return (f"<AsyncTranslateEngine(max_concurrency={self.max_concurrency}, "
+                f"per_host_limit={self.per_host_limit})>")
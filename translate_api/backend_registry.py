@@ -0,0 +1,58 @@
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class BackendRegistry:
+    """翻译接口实例登记表，线程安全。
+
+    同一接口、同一组构造参数只创建一个长期存活的实例，由所有章节和工作线程共享，
+    避免每段文本都重新创建客户端（连接池、鉴权等）。处理结束后调用 close() 统一释放。
+    """
+
+    def __init__(self):
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(name, kwargs):
+        """按接口名和构造参数计算实例的键"""
+        return name, tuple(sorted((key, repr(value)) for key, value in kwargs.items()))
+
+    def get(self, name, factory, **kwargs):
+        """获取（必要时创建）翻译接口实例
+
+        :param name: 接口名，例如 'google'、'zhipu'
+        :param factory: 创建实例的类或函数，以 kwargs 调用
+        :param kwargs: 构造参数，参数相同的调用共享同一个实例
+        """
+        key = self.make_key(name, kwargs)
+        with self._lock:
+            instance = self._instances.get(key)
+            if instance is None:
+                instance = factory(**kwargs)
+                self._instances[key] = instance
+                log.debug(f"Created translator backend '{name}': {instance}")
+            return instance
+
+    def close(self):
+        """关闭并清空所有实例（实例提供 close 方法时调用）"""
+        with self._lock:
+            instances = list(self._instances.values())
+            self._instances.clear()
+        for instance in instances:
+            close = getattr(instance, 'close', None)
+            if close is None:
+                continue
+            try:
+                close()
+            except Exception as e:
+                log.debug(f"Error closing translator backend {instance}: {e}")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._instances)
+
+    def __repr__(self):
+        return f"<BackendRegistry(instances={len(self)})>"
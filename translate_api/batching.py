@@ -0,0 +1,48 @@
+"""
+文本分批工具：把多段短文本打包成一次请求，减少请求数量。
+"""
+import math
+import re
+
+# 中日韩文字及全角符号，大模型分词时通常一个字符对应约一个 token
+CJK_PATTERN = re.compile(r'[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+
+def estimate_tokens(text):
+    """
+    粗略估算文本的 token 数：中日韩字符按 1 个计，其余字符按每 4 个 1 个计。
+
+    :param text: 文本
+    :return: 估算的 token 数
+    """
+    cjk_count = len(CJK_PATTERN.findall(text))
+    return cjk_count + math.ceil((len(text) - cjk_count) / 4)
+
+
+def iter_packed(items, max_chars=4500, separator_len=1, size_func=len, text_of=None):
+    """
+    流式分批：边读取 items 边按大小上限顺序分组，一批装满就立即返回，不需要先拿到全部文本。
+
+    :param items: 待分批的对象（可以是生成器）
+    :param max_chars: 每批合并后的大小上限（含分隔符），按 size_func 计量
+    :param separator_len: 两段文本之间分隔符（或每段编号等额外开销）的大小
+    :param size_func: 计算单段文本大小的函数，默认按字符数，也可以传入 estimate_tokens 按 token 数
+    :param text_of: 从对象中取出文本的函数，默认对象本身就是文本
+    :return: 生成器，每次返回一批对象的列表
+    """
+    current = []
+    current_len = 0
+
+    for item in items:
+        text_len = size_func(text_of(item) if text_of else item)
+        extra = text_len if not current else text_len + separator_len
+        if current and current_len + extra > max_chars:
+            yield current
+            current = []
+            current_len = 0
+            extra = text_len
+        current.append(item)
+        current_len += extra
+
+    if current:
+        yield current
@@ -3,10 +3,17 @@
 # version : 1.1.9
 import json, requests, random, re
 # import time
+import threading
 from urllib.parse import quote
+from requests.adapters import HTTPAdapter
 import urllib3
 import logging
 
+try:
+    import httpx  # 仅异步翻译引擎需要
+except ImportError:
+    httpx = None
+
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
 
@@ -193,6 +200,48 @@ DEFAULT_SERVICE_URLS = ('translate.google.ac','translate.google.ad','translate.g
 
 URLS_SUFFIX = [re.search('translate.google.(.*)', url.strip()).group(1) for url in DEFAULT_SERVICE_URLS]
 URL_SUFFIX_DEFAULT = 'com'
+DEFAULT_POOL_SIZE = 16
+MAX_TEXT_LENGTH = 5000
+# 批量翻译时各段之间的分隔符，谷歌会原样保留换行
+BATCH_SEPARATOR = "\n"
+
+# 按 (后缀, 代理) 共享的长连接会话池，所有 google_translator 实例复用，避免每次请求都重新握手
+_session_pool = {}
+_session_pool_lock = threading.Lock()
+
+
+def get_session(url_suffix, proxies=None, pool_size=DEFAULT_POOL_SIZE):
+    '''
+    获取指定后缀共享的 requests.Session（keep-alive 连接池，线程安全）。
+
+    :param url_suffix: 谷歌翻译域名后缀，例如 'com'、'co.jp'
+    :param proxies: 代理字典，例如 {'http': 'http://host:port', 'https': 'http://host:port'}
+    :param pool_size: 每个后缀保持的最大连接数，建议与翻译线程数一致
+    '''
+    key = (url_suffix, tuple(sorted((proxies or {}).items())))
+    with _session_pool_lock:
+        session = _session_pool.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.proxies = dict(proxies or {})
+            _session_pool[key] = session
+            log.debug("Created pooled session for suffix '{}' (pool size {})".format(url_suffix, pool_size))
+        return session
+
+
+def close_sessions():
+    '''关闭并清空所有共享会话'''
+    with _session_pool_lock:
+        for session in _session_pool.values():
+            try:
+                session.close()
+            except Exception as e:
+                log.debug("Error closing session: {}".format(e))
+        _session_pool.clear()
+
 
 class google_new_transError(Exception):
     """Exception that uses context to present a meaningful error message"""
@@ -221,7 +270,7 @@ class google_new_transError(Exception):
 
         else:
             status = rsp.status_code
-            reason = rsp.reason
+            reason = getattr(rsp, 'reason', None) or getattr(rsp, 'reason_phrase', '')
 
             premise = "{:d} ({}) from TTS API".format(status, reason)
 
@@ -263,9 +312,14 @@ class google_translator:
     :param proxies: proxies Will be used for every request.
     :type proxies: class : dict; like: {'http': 'http:171.112.169.47:19934/', 'https': 'https:171.112.169.47:19934/'}
 
+    :param pool_size: Max keep-alive connections kept for this url_suffix, shared by all instances.
+    :type pool_size: int
+
     '''
 
-    def __init__(self, url_suffix="com", timeout=5, proxies=None):
+    def __init__(self, url_suffix="com", timeout=5, proxies=None, pool_size=DEFAULT_POOL_SIZE):
+        if proxies == None or type(proxies) != dict:
+            proxies = {}
         self.proxies = proxies
         if url_suffix not in URLS_SUFFIX:
             self.url_suffix = URL_SUFFIX_DEFAULT
@@ -274,6 +328,7 @@ class google_translator:
         url_base = "https://translate.google.{}".format(self.url_suffix)
         self.url = url_base + "/_/TranslateWebserverUi/data/batchexecute"
         self.timeout = timeout
+        self.session = get_session(self.url_suffix, self.proxies, pool_size)
 
     def _package_rpc(self, text, lang_src='auto', lang_tgt='auto'):
         GOOGLE_TTS_RPC = ["MkEWBc"]
@@ -286,6 +341,83 @@ class google_translator:
         freq = freq_initial
         return freq
 
+    def _headers(self):
+        return {
+            "Referer": "http://translate.google.{}/".format(self.url_suffix),
+            "User-Agent":
+                "Mozilla/5.0 (Windows NT 10.0; WOW64) "
+                "AppleWebKit/537.36 (KHTML, like Gecko) "
+                "Chrome/122.0.6261.95 Safari/537.36",
+            "Content-Type": "application/x-www-form-urlencoded;charset=utf-8"
+        }
+
+    def _parse_translate_line(self, decoded_line, pronounce=False):
+        # Returns the translation carried by a "MkEWBc" response line, or None if the line holds no result
+        response = (decoded_line)
+        response = json.loads(response)
+        response = list(response)
+        response = json.loads(response[0][2])
+        response_ = list(response)
+        response = response_[1][0]
+        if len(response) == 1:
+            if len(response[0]) > 5:
+                sentences = response[0][5]
+            else: ## only url
+                sentences = response[0][0]
+                if pronounce == False:
+                    return sentences
+                elif pronounce == True:
+                    return [sentences,None,None]
+            translate_text = ""
+            for sentence in sentences:
+                sentence = sentence[0]
+                if isinstance(sentence, str):
+                    translate_text += sentence.strip() + ' '
+            translate_text = translate_text
+            if pronounce == False:
+                return translate_text
+            elif pronounce == True:
+                pronounce_src = (response_[0][0])
+                pronounce_tgt = (response_[1][0][0][1])
+                return [translate_text, pronounce_src, pronounce_tgt]
+        elif len(response) == 2:
+            sentences = []
+            for i in response:
+                sentences.append(i[0])
+            if pronounce == False:
+                return sentences
+            elif pronounce == True:
+                pronounce_src = (response_[0][0])
+                pronounce_tgt = (response_[1][0][0][1])
+                return [sentences, pronounce_src, pronounce_tgt]
+        return None
+
+    @staticmethod
+    def _batch_lines(texts):
+        lines = [' '.join(str(text).split()) for text in texts]
+        joined = BATCH_SEPARATOR.join(lines)
+        if len(joined) >= MAX_TEXT_LENGTH or not all(lines):
+            return lines, None
+        return lines, joined
+
+    @staticmethod
+    def _parse_batch_line(decoded_line, count):
+        # Returns the translated lines of a batch response, or None when they can not be aligned
+        response = json.loads(decoded_line)
+        response = json.loads(list(response)[0][2])
+        response = list(response)[1][0]
+        if len(response[0]) > 5:
+            # 保留原始换行，不能像 translate() 那样逐句 strip
+            raw_text = "".join(sentence[0] for sentence in response[0][5]
+                               if isinstance(sentence[0], str))
+        else:
+            raw_text = response[0][0]
+        parts = [part.strip() for part in raw_text.split(BATCH_SEPARATOR) if part.strip()]
+        if len(parts) != count:
+            log.debug("Batch response misaligned: sent {} lines, got {}".format(count, len(parts)))
+            return None
+        return parts
+
     def translate(self, text, lang_tgt='auto', lang_src='auto', pronounce=False):
         try:
             lang = LANGUAGES[lang_src]
@@ -296,75 +428,27 @@ class google_translator:
         except:
             lang_src = 'auto'
         text = str(text)
-        if len(text) >= 5000:
+        if len(text) >= MAX_TEXT_LENGTH:
             return "Warning: Can only detect less than 5000 characters"
         if len(text) == 0:
             return ""
-        headers = {
-            "Referer": "http://translate.google.{}/".format(self.url_suffix),
-            "User-Agent":
-                "Mozilla/5.0 (Windows NT 10.0; WOW64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/122.0.6261.95 Safari/537.36",
-            "Content-Type": "application/x-www-form-urlencoded;charset=utf-8"
-        }
         freq = self._package_rpc(text, lang_src, lang_tgt)
         response = requests.Request(method='POST',
                                     url=self.url,
                                     data=freq,
-                                    headers=headers,
+                                    headers=self._headers(),
                                     )
         try:
-            if self.proxies == None or type(self.proxies) != dict:
-                self.proxies = {}
-            with requests.Session() as s:
-                s.proxies = self.proxies
-                r = s.send(request=response.prepare(),
-                           verify=False,
-                           timeout=self.timeout)
+            r = self.session.send(request=self.session.prepare_request(response),
+                                  proxies=self.proxies,
+                                  verify=False,
+                                  timeout=self.timeout)
             for line in r.iter_lines(chunk_size=1024):
                 decoded_line = line.decode('utf-8')
                 if "MkEWBc" in decoded_line:
-                    try:
-                        response = (decoded_line)
-                        response = json.loads(response)
-                        response = list(response)
-                        response = json.loads(response[0][2])
-                        response_ = list(response)
-                        response = response_[1][0]
-                        if len(response) == 1:
-                            if len(response[0]) > 5:
-                                sentences = response[0][5]
-                            else: ## only url
-                                sentences = response[0][0]
-                                if pronounce == False:
-                                    return sentences
-                                elif pronounce == True:
-                                    return [sentences,None,None]
-                            translate_text = ""
-                            for sentence in sentences:
-                                sentence = sentence[0]
-                                if isinstance(sentence, str):
-                                    translate_text += sentence.strip() + ' '
-                            translate_text = translate_text
-                            if pronounce == False:
-                                return translate_text
-                            elif pronounce == True:
-                                pronounce_src = (response_[0][0])
-                                pronounce_tgt = (response_[1][0][0][1])
-                                return [translate_text, pronounce_src, pronounce_tgt]
-                        elif len(response) == 2:
-                            sentences = []
-                            for i in response:
-                                sentences.append(i[0])
-                            if pronounce == False:
-                                return sentences
-                            elif pronounce == True:
-                                pronounce_src = (response_[0][0])
-                                pronounce_tgt = (response_[1][0][0][1])
-                                return [sentences, pronounce_src, pronounce_tgt]
-                    except Exception as e:
-                        raise e
+                    result = self._parse_translate_line(decoded_line, pronounce)
+                    if result is not None:
+                        return result
             r.raise_for_status()
         except requests.exceptions.ConnectTimeout as e:
             raise e
@@ -375,9 +459,93 @@ class google_translator:
             # Request failed
             raise google_new_transError(tts=self)
 
+    def translate_batch(self, texts, lang_tgt='auto', lang_src='auto'):
+        '''
+        Translate several short texts with a single batchexecute request.
+
+        Each text is collapsed to one line and the texts are joined with BATCH_SEPARATOR;
+        the translated lines are split back in the same order.
+
+        :return: list of translations with the same length as texts,
+                 or None when the response can not be aligned (caller should fall back to translate()).
+        '''
+        if lang_src not in LANGUAGES:
+            lang_src = 'auto'
+        lines, joined = self._batch_lines(texts)
+        if joined is None:
+            return None
+        freq = self._package_rpc(joined, lang_src, lang_tgt)
+        request = requests.Request(method='POST',
+                                   url=self.url,
+                                   data=freq,
+                                   headers=self._headers(),
+                                   )
+        try:
+            r = self.session.send(request=self.session.prepare_request(request),
+                                  proxies=self.proxies,
+                                  verify=False,
+                                  timeout=self.timeout)
+            for line in r.iter_lines(chunk_size=1024):
+                decoded_line = line.decode('utf-8')
+                if "MkEWBc" in decoded_line:
+                    return self._parse_batch_line(decoded_line, len(lines))
+            r.raise_for_status()
+        except requests.exceptions.ConnectTimeout as e:
+            raise e
+        except requests.exceptions.HTTPError as e:
+            raise google_new_transError(tts=self, response=r)
+        except requests.exceptions.RequestException as e:
+            raise google_new_transError(tts=self)
+
+    async def _post_async(self, client, freq):
+        if httpx is None:
+            raise google_new_transError("httpx is required for the asyncio engine")
+        try:
+            r = await client.post(self.url, content=freq, headers=self._headers(), timeout=self.timeout)
+        except httpx.HTTPError as e:
+            log.debug(str(e))
+            raise google_new_transError(tts=self)
+        if r.status_code >= 400:
+            raise google_new_transError(tts=self, response=r)
+        return r
+
+    async def translate_async(self, client, text, lang_tgt='auto', lang_src='auto', pronounce=False):
+        '''
+        Async variant of translate(), sent through a shared httpx.AsyncClient.
+        '''
+        if lang_src not in LANGUAGES:
+            lang_src = 'auto'
+        text = str(text)
+        if len(text) >= MAX_TEXT_LENGTH:
+            return "Warning: Can only detect less than 5000 characters"
+        if len(text) == 0:
+            return ""
+        r = await self._post_async(client, self._package_rpc(text, lang_src, lang_tgt))
+        for decoded_line in r.text.splitlines():
+            if "MkEWBc" in decoded_line:
+                result = self._parse_translate_line(decoded_line, pronounce)
+                if result is not None:
+                    return result
+        return None
+
+    async def translate_batch_async(self, client, texts, lang_tgt='auto', lang_src='auto'):
+        '''
+        Async variant of translate_batch(), sent through a shared httpx.AsyncClient.
+        '''
+        if lang_src not in LANGUAGES:
+            lang_src = 'auto'
+        lines, joined = self._batch_lines(texts)
+        if joined is None:
+            return None
+        r = await self._post_async(client, self._package_rpc(joined, lang_src, lang_tgt))
+        for decoded_line in r.text.splitlines():
+            if "MkEWBc" in decoded_line:
+                return self._parse_batch_line(decoded_line, len(lines))
+        return None
+
     def detect(self, text):
         text = str(text)
-        if len(text) >= 5000:
+        if len(text) >= MAX_TEXT_LENGTH:
             return log.debug("Warning: Can only detect less than 5000 characters")
         if len(text) == 0:
             return ""
@@ -395,13 +563,10 @@ class google_translator:
                                     data=freq,
                                     headers=headers)
         try:
-            if self.proxies == None or type(self.proxies) != dict:
-                self.proxies = {}
-            with requests.Session() as s:
-                s.proxies = self.proxies
-                r = s.send(request=response.prepare(),
-                           verify=False,
-                           timeout=self.timeout)
+            r = self.session.send(request=self.session.prepare_request(response),
+                                  proxies=self.proxies,
+                                  verify=False,
+                                  timeout=self.timeout)
 
             for line in r.iter_lines(chunk_size=1024):
                 decoded_line = line.decode('utf-8')
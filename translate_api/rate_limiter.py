@@ -0,0 +1,182 @@
+import asyncio
+import random
+import threading
+import time
+import logging
+
+log = logging.getLogger(__name__)
+
+# 表示接口限流或暂时不可用的 HTTP 状态码
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def get_status_code(exception):
+    """从翻译接口抛出的异常中取出 HTTP 状态码，取不到返回 None"""
+    status_code = getattr(exception, 'status_code', None)
+    if status_code is not None:
+        return status_code
+    for attr in ('rsp', 'response'):
+        response = getattr(exception, attr, None)
+        if response is not None and getattr(response, 'status_code', None) is not None:
+            return response.status_code
+    return None
+
+
+def get_retry_after(exception):
+    """读取异常响应中的 Retry-After 秒数，取不到返回 None"""
+    for attr in ('rsp', 'response'):
+        response = getattr(exception, attr, None)
+        headers = getattr(response, 'headers', None)
+        if headers:
+            try:
+                return float(headers.get('Retry-After'))
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def is_throttle_error(exception):
+    """判断异常是否表示被接口限流"""
+    return get_status_code(exception) in THROTTLE_STATUS_CODES
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """非限流错误的重试等待时间：指数退避加随机抖动"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    """线程安全的令牌桶，速率可根据限流响应自适应调整（AIMD）。
+
+    收到 429/503 时速率减半并暂停一段时间，之后每次成功请求逐步恢复到配置的速率。
+    """
+
+    def __init__(self, rate, burst):
+        """
+        :param rate: 每秒补充的令牌数（即稳定状态下每秒请求数）
+        :param burst: 桶容量，允许的突发请求数
+        """
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = self.max_rate / 16
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """预定一个令牌，返回调用方发送请求前需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = max(0.0, self.paused_until - now)
+            if self.tokens < 0:
+                wait = max(wait, -self.tokens / self.rate)
+            return wait
+
+    def acquire(self):
+        """阻塞直到可以发送请求"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """acquire 的异步版本"""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        """请求成功：速率逐步恢复"""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def on_throttled(self, retry_after=None):
+        """收到限流响应：速率减半，并暂停到 Retry-After（或一个令牌的补充时间）之后"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            pause = retry_after if retry_after else max(1.0, 1.0 / self.rate)
+            self.paused_until = max(self.paused_until, now + pause)
+            self.tokens = min(self.tokens, 0.0)
+        log.warning(f"Endpoint throttled, rate lowered to {self.rate:.2f} req/s, pausing {pause:.1f}s")
+
+    def pressure(self):
+        """当前的限流压力：(剩余暂停秒数, 速率下降比例 0-1)"""
+        with self._lock:
+            return max(0.0, self.paused_until - time.monotonic()), 1.0 - self.rate / self.max_rate
+
+    def __repr__(self):
+        return f"<TokenBucket(rate={self.rate:.2f}, max_rate={self.max_rate:.2f}, capacity={self.capacity:.0f})>"
+
+
+class _UnlimitedBucket:
+    """速率配置为 0 时使用：不做任何限制"""
+
+    def reserve(self):
+        return 0.0
+
+    def acquire(self):
+        pass
+
+    async def acquire_async(self):
+        pass
+
+    def on_success(self):
+        pass
+
+    def on_throttled(self, retry_after=None):
+        pass
+
+    def pressure(self):
+        return 0.0, 0.0
+
+
+class RateLimiter:
+    """按翻译端点（谷歌后缀、智谱 API Key 等）分配令牌桶，所有工作线程共享。"""
+
+    def __init__(self, rate_limits=None):
+        """
+        :param rate_limits: {接口名: (每秒请求数, 突发数)}，例如 {'google': (5, 10), 'zhipu': (5, 10)}，
+                            每秒请求数 <= 0 表示不限速
+        """
+        self.rate_limits = rate_limits or {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, backend, endpoint=''):
+        """获取指定接口端点的令牌桶
+
+        :param backend: 接口名，例如 'google'、'zhipu'
+        :param endpoint: 端点标识，例如谷歌域名后缀或智谱 API Key
+        """
+        key = (backend, endpoint)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                rate, burst = self.rate_limits.get(backend, (0, 0))
+                bucket = TokenBucket(rate, burst) if rate and rate > 0 else _UnlimitedBucket()
+                self._buckets[key] = bucket
+            return bucket
+
+    def pressure(self):
+        """所有端点中最大的限流压力：(剩余暂停秒数, 速率下降比例 0-1)"""
+        with self._lock:
+            buckets = list(self._buckets.values())
+        pause = degradation = 0.0
+        for bucket in buckets:
+            bucket_pause, bucket_degradation = bucket.pressure()
+            pause = max(pause, bucket_pause)
+            degradation = max(degradation, bucket_degradation)
+        return pause, degradation
+
+    def __repr__(self):
+        return f"<RateLimiter(rate_limits={self.rate_limits})>"
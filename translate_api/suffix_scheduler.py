@@ -0,0 +1,149 @@
+import threading
+import time
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class SuffixStats:
+    """单个谷歌域名后缀的健康统计"""
+
+    def __init__(self):
+        self.latency = None  # 延迟的指数加权移动平均（秒），None 表示还没有样本
+        self.best_latency = None  # 观察到的最低延迟 EWMA，作为延迟上升的基准
+        self.error_rate = 0.0  # 错误率的指数加权移动平均
+        self.in_flight = 0  # 正在进行的请求数
+        self.consecutive_failures = 0
+        self.blocked_until = 0.0  # 暂停使用直到该时间（time.monotonic）
+        self.backoff = 0.0  # 当前暂停时长，连续失败时指数增长
+        self.probing = False  # 暂停结束后正在发送试探请求
+
+    def __repr__(self):
+        latency = f"{self.latency:.2f}s" if self.latency is not None else "n/a"
+        return (f"<SuffixStats(latency={latency}, error_rate={self.error_rate:.2f}, "
+                f"in_flight={self.in_flight}, backoff={self.backoff:.0f}s)>")
+
+
+class SuffixScheduler:
+    """按健康度为每个请求选择谷歌域名后缀，线程安全。
+
+    - 每个后缀记录延迟和错误率的 EWMA，以及正在进行的请求数；
+    - 每次选择预计完成最快的健康后缀：延迟 × (1 + 在途请求数) × (1 + 4 × 错误率)；
+    - 被限流或连续失败的后缀按指数退避暂停，暂停结束后只放行一个试探请求，成功才恢复。
+    """
+
+    def __init__(self, suffixes, alpha=0.3, base_backoff=5.0, max_backoff=300.0, failure_threshold=3):
+        """
+        :param suffixes: 谷歌域名后缀列表
+        :param alpha: EWMA 平滑系数
+        :param base_backoff: 第一次暂停的秒数
+        :param max_backoff: 最长暂停秒数
+        :param failure_threshold: 连续失败多少次后暂停（限流响应立即暂停）
+        """
+        self.suffixes = list(suffixes)
+        self.alpha = alpha
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.stats = {suffix: SuffixStats() for suffix in self.suffixes}
+        self._lock = threading.Lock()
+
+    def _score(self, stats):
+        # 还没有样本的后缀优先试用
+        latency = stats.latency if stats.latency is not None else 0.0
+        return latency * (1 + stats.in_flight) * (1 + 4 * stats.error_rate) + stats.in_flight * 1e-3
+
+    def acquire(self, exclude=None):
+        """选择一个后缀并登记为在途请求，请求结束后必须调用 report_success 或 report_failure
+
+        :param exclude: 本次不希望使用的后缀（例如刚刚失败的后缀），没有其他可用后缀时忽略
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = []
+            for suffix in self.suffixes:
+                stats = self.stats[suffix]
+                if stats.blocked_until > now or stats.probing:
+                    continue
+                candidates.append(suffix)
+
+            preferred = [suffix for suffix in candidates if suffix != exclude]
+            if preferred:
+                candidates = preferred
+
+            if candidates:
+                suffix = min(candidates, key=lambda item: self._score(self.stats[item]))
+            else:
+                # 全部后缀都在暂停：选最早恢复的一个，避免请求完全停顿
+                suffix = min(self.suffixes, key=lambda item: self.stats[item].blocked_until)
+
+            stats = self.stats[suffix]
+            if stats.backoff > 0:
+                # 暂停过的后缀：这是一次试探请求
+                stats.probing = True
+                log.debug(f"Probing suffix '{suffix}' after {stats.backoff:.0f}s backoff")
+            stats.in_flight += 1
+            return suffix
+
+    def report_success(self, suffix, latency):
+        """记录一次成功请求及其耗时（秒）"""
+        with self._lock:
+            stats = self.stats[suffix]
+            stats.in_flight = max(0, stats.in_flight - 1)
+            if stats.latency is None:
+                stats.latency = latency
+            else:
+                stats.latency = self.alpha * latency + (1 - self.alpha) * stats.latency
+            if stats.best_latency is None or stats.latency < stats.best_latency:
+                stats.best_latency = stats.latency
+            stats.error_rate = (1 - self.alpha) * stats.error_rate
+            stats.consecutive_failures = 0
+            if stats.backoff > 0:
+                log.info(f"Suffix '{suffix}' is healthy again")
+            stats.backoff = 0.0
+            stats.blocked_until = 0.0
+            stats.probing = False
+
+    def report_failure(self, suffix, throttled=False):
+        """记录一次失败请求
+
+        :param throttled: 是否为限流响应（429/503），限流时立即暂停该后缀
+        """
+        with self._lock:
+            stats = self.stats[suffix]
+            stats.in_flight = max(0, stats.in_flight - 1)
+            stats.error_rate = self.alpha + (1 - self.alpha) * stats.error_rate
+            stats.consecutive_failures += 1
+            if throttled or stats.probing or stats.consecutive_failures >= self.failure_threshold:
+                if stats.backoff > 0:
+                    stats.backoff = min(self.max_backoff, stats.backoff * 2)
+                else:
+                    stats.backoff = self.base_backoff
+                stats.blocked_until = time.monotonic() + stats.backoff
+                log.warning(f"Suffix '{suffix}' taken out of rotation for {stats.backoff:.0f}s")
+            stats.probing = False
+
+    def pressure(self, latency_tolerance=1.5, latency_limit=4.0):
+        """后缀整体的健康压力（0-1），取以下信号中最大的一个：
+
+        - 暂停中的后缀比例；
+        - 可用后缀中最低的错误率（请求会优先发往健康的后缀）；
+        - 可用后缀中最低的延迟上升倍数：延迟 EWMA / 最低延迟，latency_tolerance 倍以内视为正常，
+          latency_limit 倍时压力为 1。
+        """
+        now = time.monotonic()
+        with self._lock:
+            available = [stats for stats in self.stats.values() if stats.blocked_until <= now]
+            blocked = len(self.stats) - len(available)
+            if not available:
+                return 1.0
+            error_rate = min(stats.error_rate for stats in available)
+            ratios = [stats.latency / stats.best_latency for stats in available
+                      if stats.latency is not None and stats.best_latency]
+        latency_creep = 0.0
+        if ratios:
+            latency_creep = (min(ratios) - latency_tolerance) / (latency_limit - latency_tolerance)
+        return min(1.0, max(blocked / len(self.stats), error_rate, latency_creep, 0.0))
+
+    def __repr__(self):
+        return f"<SuffixScheduler({self.stats})>"
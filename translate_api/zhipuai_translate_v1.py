@@ -1,3 +1,4 @@
+import asyncio
 import json
 import re
 import time
@@ -6,6 +7,8 @@ import logging
 
 from zhipuai import ZhipuAI
 
+from translate_api.rate_limiter import is_throttle_error
+
 # 配置日志记录
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -20,82 +23,251 @@ class ZhipuAiTranslate:
         "fr": "你是一个法语翻译专家，可以把任意语言翻译为地道的法语，请帮我把下文翻译为地道易懂的法语，要求简单易懂，尽量不使用生僻的语法和字，内容也要尽量安全，别太直接。别再问我需不需要翻译了，肯定是得翻译的。"
     }
 
-    def __init__(self, zhipu_api_key, zhipu_model="glm-4-flash", zhipu_translate_timeout=10):
+    # 调用方式：sync 直接返回结果，stream 流式接收结果，async 提交异步任务后轮询
+    CALL_MODES = ('sync', 'stream', 'async')
+
+    # 异步任务轮询间隔：从 POLL_INTERVAL_MIN 开始按 POLL_BACKOFF 倍数增长，最多 POLL_INTERVAL_MAX 秒
+    POLL_INTERVAL_MIN = 0.2
+    POLL_INTERVAL_MAX = 2.0
+    POLL_BACKOFF = 1.5
+    # 未设置超时（zhipu_translate_timeout 为 None）时最多轮询的次数
+    MAX_POLLS = 40
+
+    # 多段打包翻译时追加到系统提示词后的格式要求
+    BATCH_INSTRUCTION = ("下文是若干个编号段落，每段以“[编号]”开头。请逐段翻译，每段译文单独一行并以原来的“[编号]”开头，"
+                         "保持编号和顺序不变，不要合并、拆分或遗漏段落，也不要输出编号段落以外的任何内容。")
+    # 回复中每段译文开头的编号
+    NUMBER_PATTERN = re.compile(r'^[ \t]*\[(\d+)\][ \t]*', re.MULTILINE)
+
+    def __init__(self, zhipu_api_key, zhipu_model="glm-4-flash", zhipu_translate_timeout=10, zhipu_call_mode='sync'):
+        if zhipu_call_mode not in self.CALL_MODES:
+            raise ValueError(f"Unsupported zhipu call mode: {zhipu_call_mode}")
         self.api_key = zhipu_api_key
         self.client = ZhipuAI(api_key=self.api_key)
         self.model = zhipu_model
         self.timeout = zhipu_translate_timeout
+        self.call_mode = zhipu_call_mode
+
+    def close(self):
+        """关闭底层 HTTP 客户端"""
+        self.client.close()
+
+    def __repr__(self):
+        return f"<ZhipuAiTranslate(model='{self.model}', call_mode='{self.call_mode}')>"
+
+    def _build_messages(self, user_content, target_language, batch=False):
+        system_content = self.language_system_contents.get(target_language, "")
+        if batch:
+            system_content += self.BATCH_INSTRUCTION
+        return [
+            {
+                "role": "system",
+                "content": system_content
+            },
+            {
+                "role": "user",
+                "content": user_content
+            }
+        ]
+
+    def _handle_api_error(self, e, user_content):
+        """限流错误交给调用方的限速器处理，其余接口错误返回错误提示，无法识别的错误返回 None"""
+        if is_throttle_error(e):
+            raise e
+        logging.error(f"Error checking task status: {e}")
+        error_message = self.extract_error_message(e)
+        if error_message:
+            logging.error(f"API error: {error_message}")
+            logging.error(f"内容无法翻译: {user_content}")
+            return f"智谱API error: {error_message}"
+        return None
+
+    def _poll_expired(self, start_time, polls):
+        """轮询是否应当结束：超过 timeout 秒，或未设置超时时达到 MAX_POLLS 次"""
+        if self.timeout is None:
+            return polls >= self.MAX_POLLS
+        return time.time() - start_time > self.timeout
+
+    def _next_poll_interval(self, interval):
+        return min(self.POLL_INTERVAL_MAX, interval * self.POLL_BACKOFF)
+
+    @staticmethod
+    def _build_batch_content(texts):
+        """把多段文本拼成编号段落，每段压成一行"""
+        return "\n".join(f"[{number}] {' '.join(str(text).split())}" for number, text in enumerate(texts, 1))
+
+    @classmethod
+    def _parse_batch_reply(cls, reply, count):
+        """按编号拆分多段翻译的回复
+
+        :return: 与原文顺序对应的译文列表，无法对齐的段落为 None；回复不可用（空、接口错误或完全无法对齐）时返回 None
+        """
+        if not reply or reply.startswith("智谱API error"):
+            return None
+        matches = list(cls.NUMBER_PATTERN.finditer(reply))
+        results = [None] * count
+        for position, match in enumerate(matches):
+            number = int(match.group(1))
+            end = matches[position + 1].start() if position + 1 < len(matches) else len(reply)
+            text = reply[match.end():end].strip()
+            if not 1 <= number <= count or not text:
+                continue
+            # 同一编号出现多次说明回复格式混乱，该段按未对齐处理
+            results[number - 1] = text if results[number - 1] is None else False
+        results = [result if result else None for result in results]
+        if not any(results):
+            # 一段都没有对齐，视为回复不可用
+            return None
+        return results
 
     def translate(self, user_content, target_language):
-        self.user_content = user_content
-        self.target_language = target_language
-        self.system_content = self.language_system_contents.get(self.target_language, "")
-        self.task_id = None
-        self.task_status = ''
-        self.assistant_content = ''
+        return self._complete(self._build_messages(user_content, target_language), user_content)
+
+    def translate_batch(self, texts, target_language):
+        """把多段文本打包成一个带编号的提示词翻译，系统提示词只发送一次
+
+        :param texts: 原文列表
+        :param target_language: 目标语言
+        :return: 与 texts 对应的译文列表，未对齐的段落为 None；整个回复不可用时返回 None
+        """
+        user_content = self._build_batch_content(texts)
+        reply = self._complete(self._build_messages(user_content, target_language, batch=True), user_content)
+        return self._parse_batch_reply(reply, len(texts))
+
+    def _complete(self, messages, user_content):
+        if self.call_mode == 'async':
+            return self._translate_by_task(messages, user_content)
+        return self._translate_direct(messages, user_content)
+
+    def _translate_direct(self, messages, user_content):
+        """直接（或流式）调用对话补全接口，一次请求拿到译文"""
+        try:
+            if self.call_mode == 'stream':
+                response = self.client.chat.completions.create(model=self.model, messages=messages,
+                                                               stream=True, timeout=self.timeout)
+                parts = []
+                for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                return "".join(parts)
 
+            response = self.client.chat.completions.create(model=self.model, messages=messages,
+                                                           timeout=self.timeout)
+            return response.choices[0].message.content
+        except Exception as e:
+            error_result = self._handle_api_error(e, user_content)
+            if error_result is None:
+                raise
+            return error_result
+
+    def _translate_by_task(self, messages, user_content):
+        """提交异步任务并轮询结果，轮询间隔按退避策略增长"""
         # 提交任务
         try:
             response = self.client.chat.asyncCompletions.create(
                 model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": self.system_content
-                    },
-                    {
-                        "role": "user",
-                        "content": self.user_content
-                    }
-                ],
+                messages=messages,
             )
-            self.task_id = response.id
+            task_id = response.id
         except Exception as e:
-            logging.error(f"Error checking task status: {e}")
-            error_message = self.extract_error_message(e)
-            if error_message:
-                logging.error(f"API error: {error_message}")
-                logging.error(f"内容无法翻译: {self.user_content}")
-                return f"智谱API error: {error_message}"
+            error_result = self._handle_api_error(e, user_content)
+            if error_result is None:
+                raise
+            return error_result
 
         # 检查任务状态
         start_time = time.time()
-        get_cnt = 0
-        while self.task_status != 'SUCCESS' and self.task_status != 'FAILED' and get_cnt <= 40:
+        task_status = ''
+        assistant_content = ''
+        poll_interval = self.POLL_INTERVAL_MIN
+        polls = 0
+        while True:
+            time.sleep(poll_interval)
+            polls += 1
             try:
-                result_response = self.client.chat.asyncCompletions.retrieve_completion_result(id=self.task_id)
-                self.task_status = result_response.task_status
+                result_response = self.client.chat.asyncCompletions.retrieve_completion_result(id=task_id)
+                task_status = result_response.task_status
                 logging.debug(f'result_response: {result_response}')
 
                 if hasattr(result_response, 'choices') and result_response.choices:
-                    self.assistant_content = result_response.choices[0].message.content
+                    assistant_content = result_response.choices[0].message.content
+            except Exception as e:
+                error_result = self._handle_api_error(e, user_content)
+                if error_result is not None:
+                    return error_result
+
+            if task_status in ('SUCCESS', 'FAILED'):
+                break
+            # 检查是否超时
+            if self._poll_expired(start_time, polls):
+                logging.error("Translation timed out.")
+                return None
+            poll_interval = self._next_poll_interval(poll_interval)
+
+        if task_status == 'SUCCESS':
+            logging.info("Translation completed successfully.")
+            return assistant_content  # 返回翻译结果
+        logging.error("Translation failed.")
+        return None
+
+    async def translate_async(self, user_content, target_language):
+        """异步版本的 translate：SDK 调用放到线程中执行，轮询等待使用 asyncio.sleep，不占用线程"""
+        return await self._complete_async(self._build_messages(user_content, target_language), user_content)
+
+    async def translate_batch_async(self, texts, target_language):
+        """translate_batch 的异步版本"""
+        user_content = self._build_batch_content(texts)
+        reply = await self._complete_async(self._build_messages(user_content, target_language, batch=True),
+                                           user_content)
+        return self._parse_batch_reply(reply, len(texts))
+
+    async def _complete_async(self, messages, user_content):
+        if self.call_mode != 'async':
+            return await asyncio.to_thread(self._translate_direct, messages, user_content)
+
+        # 提交任务
+        try:
+            response = await asyncio.to_thread(self.client.chat.asyncCompletions.create, model=self.model,
+                                               messages=messages)
+            task_id = response.id
+        except Exception as e:
+            error_result = self._handle_api_error(e, user_content)
+            if error_result is None:
+                raise
+            return error_result
 
-                    # 检查是否超时
-                elapsed_time = time.time() - start_time
-                if elapsed_time > self.timeout:
-                    logging.error("Translation timed out.")
-                    return None
+        # 检查任务状态
+        start_time = time.time()
+        task_status = ''
+        assistant_content = ''
+        poll_interval = self.POLL_INTERVAL_MIN
+        polls = 0
+        while True:
+            await asyncio.sleep(poll_interval)
+            polls += 1
+            try:
+                result_response = await asyncio.to_thread(
+                    self.client.chat.asyncCompletions.retrieve_completion_result, id=task_id)
+                task_status = result_response.task_status
 
+                if hasattr(result_response, 'choices') and result_response.choices:
+                    assistant_content = result_response.choices[0].message.content
             except Exception as e:
-                logging.error(f"Error checking task status: {e}")
-                error_message = self.extract_error_message(e)
-                if error_message:
-                    logging.error(f"API error: {error_message}")
-                    logging.error(f"内容无法翻译: {self.user_content}")
-                    return f"智谱API error: {error_message}"
+                error_result = self._handle_api_error(e, user_content)
+                if error_result is not None:
+                    return error_result
 
-            time.sleep(1)
-            get_cnt += 1
+            if task_status in ('SUCCESS', 'FAILED'):
+                break
+            if self._poll_expired(start_time, polls):
+                logging.error("Translation timed out.")
+                return None
+            poll_interval = self._next_poll_interval(poll_interval)
 
-        if self.task_status == 'SUCCESS':
-            logging.info("Translation completed successfully.")
-            return self.assistant_content  # 返回翻译结果
-        elif self.task_status == 'FAILED':
-            logging.error("Translation failed.")
-            return None
-        else:
-            logging.error("Translation status check exceeded maximum attempts.")
-            return None
+        if task_status == 'SUCCESS':
+            return assistant_content
+        logging.error("Translation failed.")
+        return None
 
     def extract_error_message(self, exception):
         # 使用正则表达式查找大括号包围的内容
@@ -0,0 +1,129 @@
+"""
+全书范围的工作调度：按 OPF spine 和章节文本段数估算工作量，按最长作业优先的顺序处理章节，
+所有章节的翻译请求进入同一个优先级队列，工作量大的章节先被处理。
+"""
+import itertools
+import logging
+import posixpath
+import queue
+import re
+import threading
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import Future
+
+log = logging.getLogger(__name__)
+
+CONTAINER_PATH = 'META-INF/container.xml'
+
+
+def read_spine(read_member):
+    """读取 OPF spine 中章节的成员名，按阅读顺序排列
+
+    :param read_member: 按成员名读取内容（bytes）的函数，成员不存在时抛出 KeyError 或 OSError
+    :return: 成员名列表，无法读取时返回空列表
+    """
+    try:
+        container = ElementTree.fromstring(read_member(CONTAINER_PATH))
+        rootfile = next(element for element in container.iter() if element.tag.endswith('rootfile'))
+        opf_path = rootfile.get('full-path')
+        package = ElementTree.fromstring(read_member(opf_path))
+    except (KeyError, OSError, StopIteration, ElementTree.ParseError) as e:
+        log.debug(f"Unable to read the OPF spine: {e}")
+        return []
+
+    opf_dir = posixpath.dirname(opf_path)
+    manifest = {}
+    spine = []
+    for element in package.iter():
+        if element.tag.endswith('}item') or element.tag == 'item':
+            href = element.get('href')
+            if href:
+                manifest[element.get('id')] = posixpath.normpath(posixpath.join(opf_dir, href.split('#')[0]))
+        elif element.tag.endswith('}itemref') or element.tag == 'itemref':
+            spine.append(element.get('idref'))
+    return [manifest[idref] for idref in spine if idref in manifest]
+
+
+def build_segment_counter(tags):
+    """构造统计章节中文本段数的函数：按需要翻译的标签的开始标签计数，不做完整解析"""
+    names = '|'.join(re.escape(tag) for tag in sorted(tags))
+    pattern = re.compile(rf'<(?:[\w.-]+:)?(?:{names})[\s/>]')
+
+    def count_segments(xhtml_content):
+        return len(pattern.findall(xhtml_content))
+
+    return count_segments
+
+
+def order_chapters(chapters, works, spine_positions):
+    """按最长作业优先排列章节，工作量相同时按 spine 顺序，不在 spine 中的排在最后
+
+    :param chapters: 章节列表
+    :param works: {章节: 估算的工作量}
+    :param spine_positions: {章节: 在 spine 中的位置}
+    """
+    last = len(spine_positions)
+    return sorted(chapters, key=lambda chapter: (-works.get(chapter, 0), spine_positions.get(chapter, last)))
+
+
+class PriorityExecutor:
+    """按优先级取任务的线程池：priority 越小越先执行，相同优先级按提交顺序执行"""
+
+    def __init__(self, max_workers, name='PriorityExecutor'):
+        """
+        :param max_workers: 工作线程数
+        :param name: 线程名前缀
+        """
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+        self.max_workers = max_workers
+        self.name = name
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, fn, *args, priority=0, **kwargs):
+        """提交任务，返回 concurrent.futures.Future"""
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            self._queue.put((priority, next(self._counter), future, fn, args, kwargs))
+            # 按需启动工作线程，直到达到上限
+            if len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._worker, name=f"{self.name}_{len(self._threads)}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return future
+
+    def _worker(self):
+        while True:
+            priority, count, future, fn, args, kwargs = self._queue.get()
+            if future is None:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait=True):
+        """执行完已提交的任务后停止所有工作线程"""
+        with self._lock:
+            self._shutdown = True
+            threads = list(self._threads)
+        # 结束标记排在所有任务之后
+        for _ in threads:
+            self._queue.put((float('inf'), next(self._counter), None, None, None, None))
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def __repr__(self):
+        return f"<PriorityExecutor(name='{self.name}', max_workers={self.max_workers})>"
@@ -1,22 +1,40 @@
 import argparse
-import random
-import re
+import asyncio
 import shutil
 import signal
 import time
 import logging
+import multiprocessing
 import os
 import sys
+import threading
 
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from bs4 import BeautifulSoup, NavigableString
-from itertools import cycle
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from operator import itemgetter
 from tqdm import tqdm
 from custom_logger import Logger
 
-from translate_api.google_translate_v2 import google_translator
+from translate_api.google_translate_v2 import google_translator, BATCH_SEPARATOR
 from translate_api.zhipuai_translate_v1 import ZhipuAiTranslate
+from translate_api.batching import estimate_tokens, iter_packed
+from translate_api.async_engine import AsyncTranslateEngine
+from translate_api.backend_registry import BackendRegistry
+from translate_api.suffix_scheduler import SuffixScheduler
+from translate_api.rate_limiter import RateLimiter, backoff_delay, get_retry_after, is_throttle_error
+from db.translation_memory import TranslationMemory
+from segment_dedup import SegmentDeduplicator
+from segment_filter import CHAPTER_PARTIAL, CHAPTER_TRANSLATED, SegmentFilter
+from xhtml_parser import XHTMLParser
+from work_scheduler import PriorityExecutor
+import chapter_stage
+
+# 文本段日志每累计多少条译文写入一次
+JOURNAL_BATCH_SIZE = 100
+
+# 后端压力最大时章节之间的最长等待秒数
+MAX_CHAPTER_PACING = 5.0
 
 
 # 定义信号处理函数
@@ -30,7 +48,10 @@ def signal_handler(sig, frame):
 class XHTMLTranslator:
     def __init__(self, http_proxy, gtransapi_suffixes, dest_lang, transMode=1,
                  TranslateThreadWorkers=16, tags_to_translate="title,h1,h2,p",
-                 translator_api='google', **translator_kwargs):
+                 translator_api='google', batch_max_chars=4500, translation_memory_path=None,
+                 translation_memory_lru_size=10000, concurrency_mode='thread', async_max_concurrency=64,
+                 async_per_host_limit=8, rate_limits=None, zhipu_batch_max_tokens=1500, xhtml_parser='auto',
+                 source_lang='auto', translated_ratio=0.9, parse_processes=0, **translator_kwargs):
         # 设置 logger
         self.logger = logging.getLogger(__name__)
         
@@ -40,17 +61,23 @@ class XHTMLTranslator:
         self.transMode = transMode
         self.TranslateThreadWorkers = TranslateThreadWorkers
         self.gtransapi_suffixes = gtransapi_suffixes.split(',')
-        self.gtransapi_suffixes_cycle = cycle(self.gtransapi_suffixes)  # 使用无限循环
+        # 按延迟、错误率和限流情况为每个请求选择域名后缀
+        self.suffix_scheduler = SuffixScheduler(self.gtransapi_suffixes)
 
         self.tags_to_translate = tags_to_translate.split(',')
+        # 谷歌批量翻译时每个请求的最大字符数，<= 0 表示逐段翻译
+        self.batch_max_chars = batch_max_chars
+        # 智谱多段打包翻译时每个提示词的原文 token 预算，<= 0 表示逐段翻译
+        self.zhipu_batch_max_tokens = zhipu_batch_max_tokens
 
         self.logger.debug(f"http_proxy: {self.http_proxy}")
         self.logger.debug(f"dest_lang: {self.dest_lang}")
         self.logger.debug(f"TransMode: {self.transMode}")
         self.logger.debug(f"TranslateThreadWorkers: {self.TranslateThreadWorkers}")
         self.logger.debug(f"gtransapi_suffixes: {self.gtransapi_suffixes}")
-        self.logger.debug(f"gtransapi_suffixes_cycle: {self.gtransapi_suffixes_cycle}")
         self.logger.debug(f"tags_to_translate: {self.tags_to_translate}")
+        self.logger.debug(f"batch_max_chars: {self.batch_max_chars}")
+        self.logger.debug(f"zhipu_batch_max_tokens: {self.zhipu_batch_max_tokens}")
 
         # 指定翻译API
         self.translator_api = translator_api
@@ -60,6 +87,58 @@ class XHTMLTranslator:
         self.logger.debug(f"translator_api: {self.translator_api}")
         self.logger.debug(f"translator_kwargs: {self.translator_kwargs}")
 
+        # 长期存活的翻译接口实例（谷歌按后缀、智谱按配置），所有章节和工作线程共享
+        self.backend_registry = BackendRegistry()
+
+        # 源语言：用于筛选需要翻译的文本并区分翻译记忆，auto 表示由接口自动识别
+        self.source_lang = source_lang
+        # 文本段分类器：标签集合 + 按源语言/目标语言文字预编译的正则
+        # 目标语言文字占比达到 translated_ratio 的章节视为已翻译
+        self.segment_filter = SegmentFilter(self.tags_to_translate, source_lang, dest_lang,
+                                            chapter_ratio=translated_ratio, trans_mode=transMode)
+        self.logger.debug(f"segment_filter: {self.segment_filter}")
+
+        # 翻译记忆库，路径为空时不启用；首次使用时打开，关闭后可以重新打开
+        self.translation_memory_path = translation_memory_path
+        self.translation_memory_lru_size = translation_memory_lru_size
+        self._translation_memory = None
+        self._translation_memory_lock = threading.Lock()
+        self.logger.debug(f"translation_memory_path: {self.translation_memory_path}")
+
+        # 全书范围的文本段去重登记表，各章节共享
+        self.segment_dedup = SegmentDeduplicator()
+
+        # 并发模式：thread 为每章一个线程池，asyncio 为所有章节共享的异步引擎
+        if concurrency_mode not in ('thread', 'asyncio'):
+            raise ValueError(f"Unsupported concurrency mode: {concurrency_mode}")
+        self.concurrency_mode = concurrency_mode
+        self.async_max_concurrency = async_max_concurrency
+        self.async_per_host_limit = async_per_host_limit
+        self._async_engine = None
+        self._async_engine_lock = threading.Lock()
+        self.logger.debug(f"concurrency_mode: {self.concurrency_mode}")
+
+        # 线程模式下进程内所有章节（和书籍）共享的翻译线程池，TranslateThreadWorkers 即同时进行的请求数上限；
+        # 按优先级（章节工作量，大的在前）取文本段
+        self.segment_workers = TranslateThreadWorkers
+        self.chapter_priorities = {}  # 章节 -> 优先级，越小越先翻译
+        self._segment_executor = None
+        self._segment_executor_lock = threading.Lock()
+
+        # 按翻译端点限速的令牌桶，所有章节和工作线程共享
+        self.rate_limiter = RateLimiter(rate_limits)
+        self.logger.debug(f"rate_limiter: {self.rate_limiter}")
+
+        # 章节解析器：auto 优先使用 lxml，章节不是合法 XML 时退回 html.parser
+        self.xhtml_parser = XHTMLParser(xhtml_parser)
+        self.logger.debug(f"xhtml_parser: {self.xhtml_parser}")
+
+        # 解析/提取和回填/序列化使用的进程数，0 表示在章节线程中完成
+        self.parse_processes = parse_processes
+        self._parse_pool = None
+        self._parse_pool_lock = threading.Lock()
+        self.logger.debug(f"parse_processes: {self.parse_processes}")
+
     def get_translator_class(self):
         # 根据translator_api返回对应的翻译类
         if self.translator_api == 'zhipu':
@@ -69,89 +148,510 @@ class XHTMLTranslator:
         else:
             raise ValueError(f"Unsupported translator API: {self.translator_api}")
 
+    def get_google_translator(self, url_suffix):
+        """获取指定后缀的谷歌翻译器实例，同一后缀的所有线程共享一个实例及其连接池。"""
+        return self.backend_registry.get('google', google_translator, timeout=5, url_suffix=url_suffix,
+                                         proxies={'http': self.http_proxy, 'https': self.http_proxy},
+                                         pool_size=self.TranslateThreadWorkers)
+
+    def get_translator(self):
+        """获取当前翻译接口的共享实例，相同配置的所有线程共享同一个客户端"""
+        return self.backend_registry.get(self.translator_api, self.get_translator_class(), **self.translator_kwargs)
+
+    def close_backends(self):
+        """关闭所有翻译接口实例"""
+        self.backend_registry.close()
+
+    def get_async_engine(self):
+        """获取（必要时创建）共享的异步翻译引擎"""
+        with self._async_engine_lock:
+            if self._async_engine is None:
+                self._async_engine = AsyncTranslateEngine(max_concurrency=self.async_max_concurrency,
+                                                          per_host_limit=self.async_per_host_limit,
+                                                          http_proxy=self.http_proxy)
+                self.logger.debug(f"Started {self._async_engine}")
+            return self._async_engine
+
+    def close_async_engine(self):
+        """关闭异步翻译引擎"""
+        with self._async_engine_lock:
+            if self._async_engine is not None:
+                self._async_engine.close()
+                self._async_engine = None
+
+    def get_segment_executor(self):
+        """获取（必要时创建）所有章节共享的翻译线程池"""
+        with self._segment_executor_lock:
+            if self._segment_executor is None:
+                self._segment_executor = PriorityExecutor(self.segment_workers, name='SegmentWorker')
+                self.logger.debug(f"Started {self._segment_executor}")
+            return self._segment_executor
+
+    def close_segment_executor(self):
+        """等待已提交的翻译任务完成并关闭共享线程池"""
+        with self._segment_executor_lock:
+            executor, self._segment_executor = self._segment_executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def get_parse_pool(self):
+        """获取（必要时创建）章节解析进程池"""
+        with self._parse_pool_lock:
+            if self._parse_pool is None:
+                # 主进程中已有多个线程，使用 spawn 避免 fork 时复制被其他线程持有的锁
+                self._parse_pool = ProcessPoolExecutor(max_workers=self.parse_processes,
+                                                       mp_context=multiprocessing.get_context('spawn'))
+                self.logger.debug(f"Started a parse pool with {self.parse_processes} processes")
+            return self._parse_pool
+
+    def close_parse_pool(self):
+        """关闭章节解析进程池"""
+        with self._parse_pool_lock:
+            pool, self._parse_pool = self._parse_pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def get_translation_memory(self):
+        """获取（必要时打开）翻译记忆库，未启用时返回 None"""
+        if not self.translation_memory_path:
+            return None
+        with self._translation_memory_lock:
+            if self._translation_memory is None:
+                self._translation_memory = TranslationMemory(self.translation_memory_path,
+                                                             self.translation_memory_lru_size)
+                self.logger.debug(f"Opened {self._translation_memory}")
+            return self._translation_memory
+
+    def close_translation_memory(self):
+        """写入未保存的译文并关闭翻译记忆库"""
+        with self._translation_memory_lock:
+            memory, self._translation_memory = self._translation_memory, None
+        if memory is not None:
+            memory.close()
+
+    def run_chapter_stage(self, func, *args):
+        """执行章节的 CPU 阶段：配置了解析进程时在进程池中执行，否则在当前线程执行"""
+        if self.parse_processes > 0:
+            return self.get_parse_pool().submit(func, *args).result()
+        return func(*args)
+
+    def submit_translation(self, func, async_func, arg, priority=0):
+        """按并发模式提交翻译任务，返回 concurrent.futures.Future
+
+        :param func: 线程模式调用的同步翻译方法
+        :param async_func: 异步模式调用的协程方法
+        :param arg: 待翻译文本（或谷歌批量翻译的文本列表）
+        :param priority: 线程模式下的优先级，越小越先执行
+        """
+        if self.concurrency_mode == 'asyncio':
+            return self.get_async_engine().submit(async_func(arg))
+        return self.get_segment_executor().submit(func, arg, priority=priority)
+
+    def get_translator_model(self):
+        """返回当前翻译接口使用的模型名称，用于区分翻译记忆"""
+        if self.translator_api == 'zhipu':
+            return self.translator_kwargs.get('zhipu_model') or 'glm-4-flash'
+        return ''
+
+    def lookup_memory(self, text):
+        """从翻译记忆库中查询已格式化的译文，未启用或未命中返回 None"""
+        memory = self.get_translation_memory()
+        if memory is None:
+            return None
+        return memory.get(text, self.source_lang, self.dest_lang, self.translator_api,
+                          self.get_translator_model(), self.transMode)
+
+    @staticmethod
+    def is_storable(translated_text):
+        """是否为可以保存的译文：接口返回的错误提示不保存
+
+        :param translated_text: 接口原始结果或格式化后的译文（不可用的结果不会被格式化）
+        """
+        if not isinstance(translated_text, str) or not translated_text:
+            return False
+        return "智谱API error" not in translated_text and not translated_text.startswith("Warning: Can only detect")
+
+    def store_memory(self, segments):
+        """把一个任务中成功的译文一次写入翻译记忆库，接口返回的错误提示不写入
+
+        :param segments: [(原文, 译文)]
+        """
+        memory = self.get_translation_memory()
+        if memory is None:
+            return
+        segments = [(text, translated_text) for text, translated_text in segments
+                    if self.is_storable(translated_text)]
+        memory.put_many(segments, self.source_lang, self.dest_lang, self.translator_api,
+                        self.get_translator_model(), self.transMode)
+
+    def journal_key(self, text):
+        """文本段日志的哈希键，与翻译记忆使用相同的内容哈希"""
+        return TranslationMemory.make_key(text, self.source_lang, self.dest_lang, self.translator_api,
+                                          self.get_translator_model(), self.transMode)
+
+    def dedup_scope(self, chapter_item):
+        """章节所属的去重登记表范围，默认所有章节共用一个"""
+        return None
+
+    def load_segment_journal(self, chapter_item):
+        """返回章节上次中断前已完成的文本段 {哈希键: 译文}，默认不记录日志"""
+        return {}
+
+    def save_segment_journal(self, chapter_item, segments):
+        """记录章节中已完成的文本段 [(哈希键, 译文)]，默认不记录日志"""
+
+    def resolve_segments(self, segments, task):
+        """翻译任务完成回调：把结果写入翻译记忆库，并通知等待同一文本的所有章节
+
+        :param segments: 该任务负责的 (text, Future) 列表
+        :param task: 已完成的翻译任务
+        """
+        try:
+            result = task.result()
+        except Exception as e:
+            self.logger.error(f"Translation task failed: {e}")
+            result = [None] * len(segments)
+        translated_texts = result if isinstance(result, list) else [result]
+
+        self.store_memory([(text, translated_text) for (text, future), translated_text
+                           in zip(segments, translated_texts)])
+        for (text, future), translated_text in zip(segments, translated_texts):
+            self.segment_dedup.resolve(text, future, translated_text)
+
     # def create_translator_instance(self):
     #     # 获取翻译类
     #     translator_class = self.get_translator_class()
     #     # 根据翻译类和参数创建实例
     #     return translator_class(**self.translator_kwargs)
 
+    def get_rate_bucket(self, url_suffix=None):
+        """获取当前请求端点的令牌桶：谷歌按域名后缀，其他接口按 API Key"""
+        if self.translator_api == 'google':
+            return self.rate_limiter.bucket('google', url_suffix)
+        return self.rate_limiter.bucket(self.translator_api, self.translator_kwargs.get('zhipu_api_key') or '')
+
+    @staticmethod
+    def retry_delay(bucket, e, attempt):
+        """记录一次失败并返回重试前的等待秒数
+
+        限流错误交给令牌桶降速和暂停（下一次 acquire 时等待），其他错误使用指数退避。
+        """
+        if is_throttle_error(e):
+            bucket.on_throttled(get_retry_after(e))
+            return 0
+        return backoff_delay(attempt)
+
+    def pacing_delay(self):
+        """根据后端反馈计算章节之间的等待秒数，后端健康时返回 0
+
+        信号来自令牌桶（限流暂停、被降低的速率）和谷歌后缀调度（暂停的后缀、错误率、延迟上升），
+        等待时间随压力线性增加，最多 MAX_CHAPTER_PACING 秒；端点仍在限流暂停中时至少等到暂停结束。
+        """
+        pause, pressure = self.rate_limiter.pressure()
+        if self.translator_api == 'google':
+            pressure = max(pressure, self.suffix_scheduler.pressure())
+        return max(pause, pressure * MAX_CHAPTER_PACING)
+
     def translate_text_common(self, text):
         """翻译单个文本，支持字符串和字符串列表。"""
         max_retries = 3
 
-        translator_class = self.get_translator_class()
-        self.logger.debug(f"translator_class: {translator_class}")
-
-        translatorObj = translator_class(**self.translator_kwargs)
+        translatorObj = self.get_translator()
+        self.logger.debug(f"translatorObj: {translatorObj}")
+        bucket = self.get_rate_bucket()
 
         for attempt in range(max_retries):
             try:
                 self.logger.debug(f"Translating text: {text} at {attempt} time")
 
                 if isinstance(text, str):
+                    bucket.acquire()
                     result = translatorObj.translate(text, self.dest_lang)
+                    bucket.on_success()
                     self.logger.debug(f"Translated result: {result}")
                     return self.format_result(text, result)
                 else:
-                    results = [translatorObj.translate(substr, self.dest_lang) for substr in text]
+                    results = []
+                    for substr in text:
+                        bucket.acquire()
+                        results.append(translatorObj.translate(substr, self.dest_lang))
+                        bucket.on_success()
                     self.logger.debug(f"Translated results: {results}")
                     return [self.format_result(substr, result) for substr, result in zip(text, results)]
             except Exception as e:
                 self.logger.warning(f"Error during translation attempt {attempt + 1}: {e}")
-                wait_time = random.uniform(2, 7)
-                time.sleep(wait_time)
+                time.sleep(self.retry_delay(bucket, e, attempt))
 
         self.logger.critical("Translation failed after multiple attempts. Returning original text.")
         return {"original": text, "error": "Translation failed"}
 
+    def translate_batch_common(self, texts):
+        """把多段文本打包成一个带编号的提示词翻译（智谱），返回与 texts 对应的结果列表。
+
+        整个回复不可用时对半拆分后分别重试，部分段落未对齐时只重新翻译这些段落。
+        """
+        if len(texts) == 1:
+            return [self.translate_text_common(texts[0])]
+
+        max_retries = 3
+        translatorObj = self.get_translator()
+        bucket = self.get_rate_bucket()
+
+        for attempt in range(max_retries):
+            try:
+                self.logger.debug(f"Translating batch of {len(texts)} texts at {attempt} time")
+                bucket.acquire()
+                results = translatorObj.translate_batch(texts, self.dest_lang)
+                bucket.on_success()
+                break
+            except Exception as e:
+                self.logger.warning(f"Error during batch translation attempt {attempt + 1}: {e}")
+                time.sleep(self.retry_delay(bucket, e, attempt))
+        else:
+            self.logger.critical("Batch translation failed after multiple attempts.")
+            return [{"original": text, "error": "Translation failed"} for text in texts]
+
+        if results is None:
+            middle = len(texts) // 2
+            self.logger.warning(f"Batch of {len(texts)} texts returned no usable reply, "
+                                f"splitting into {middle} + {len(texts) - middle}.")
+            return self.translate_batch_common(texts[:middle]) + self.translate_batch_common(texts[middle:])
+
+        missing = [index for index, result in enumerate(results) if result is None]
+        formatted = [self.format_result(text, result) for text, result in zip(texts, results)]
+        if missing:
+            self.logger.warning(f"{len(missing)} of {len(texts)} texts in the batch could not be aligned, retrying them.")
+            for index, result in zip(missing, self.translate_batch_common([texts[index] for index in missing])):
+                formatted[index] = result
+        self.logger.debug(f"Translated batch results: {formatted}")
+        return formatted
 
     def translate_text_google(self, text):
         """翻译单个文本，支持字符串和字符串列表。"""
         max_retries = 5
-
-        translator_class = self.get_translator_class()
-        self.logger.debug(f"translator_class: {translator_class}")
-
-        # 每次请求时都创建获取当前前缀并且创建新的翻译器实例
-        self.current_suffix = next(self.gtransapi_suffixes_cycle)
-        translatorObj = translator_class(timeout=5, url_suffix=self.current_suffix,
-                                          proxies={'http': self.http_proxy, 'https': self.http_proxy})
-        # 创建翻译器实例
+        suffix = None
 
         for attempt in range(max_retries):
+            # 每次尝试都由调度器选择当前最健康的后缀，失败后优先换用其他后缀
+            suffix = self.suffix_scheduler.acquire(exclude=suffix)
+            translatorObj = self.get_google_translator(suffix)
+            bucket = self.get_rate_bucket(suffix)
             try:
-                self.logger.debug(f"Translating text: {text} using suffix: {self.current_suffix}")
+                self.logger.debug(f"Translating text: {text} using suffix: {suffix}")
 
                 if isinstance(text, str):
+                    bucket.acquire()
+                    start_time = time.monotonic()
                     result = translatorObj.translate(text, self.dest_lang)
+                    self.suffix_scheduler.report_success(suffix, time.monotonic() - start_time)
+                    bucket.on_success()
                     self.logger.debug(f"Translated result: {result}")
                     return self.format_result(text, result)
                 else:
-                    results = [translatorObj.translate(substr, self.dest_lang) for substr in text]
+                    results = []
+                    start_time = time.monotonic()
+                    for substr in text:
+                        bucket.acquire()
+                        results.append(translatorObj.translate(substr, self.dest_lang))
+                        bucket.on_success()
+                    self.suffix_scheduler.report_success(suffix, (time.monotonic() - start_time) / max(1, len(text)))
                     self.logger.debug(f"Translated results: {results}")
                     return [self.format_result(substr, result) for substr, result in zip(text, results)]
             except Exception as e:
-                self.logger.warning(f"Error during translation attempt {attempt + 1}: {e}")
-                wait_time = random.uniform(2, 7)
-                if attempt < 2:
-                    # 前 3 次不修改后缀
-                    self.logger.warning(f"Retrying in {wait_time:.2f} seconds without changing suffix...")
-                else:
-                    # 从第 4 次开始修改后缀并重建实例
-                    self.current_suffix = next(self.gtransapi_suffixes_cycle)
-                    translatorObj = translator_class(timeout=5, url_suffix=self.current_suffix,
-                                                      proxies={'http': self.http_proxy, 'https': self.http_proxy})
-                    self.logger.error(f"Retrying in {wait_time:.2f} seconds with new suffix: {self.current_suffix}...")
+                self.logger.warning(f"Error during translation attempt {attempt + 1} with suffix '{suffix}': {e}")
+                self.suffix_scheduler.report_failure(suffix, throttled=is_throttle_error(e))
+                wait_time = self.retry_delay(bucket, e, attempt)
+                self.logger.warning(f"Retrying in {wait_time:.2f} seconds...")
+                time.sleep(wait_time)
 
+        self.logger.critical("Translation failed after multiple attempts. Returning original text.")
+        return {"original": text, "error": "Translation failed"}
+
+    def translate_batch_google(self, texts):
+        """把多段文本合并为一次谷歌请求翻译，返回与 texts 对应的结果列表。
+
+        响应无法按分隔符对齐时，退回逐段调用 translate_text_google。
+        """
+        if len(texts) == 1:
+            return [self.translate_text_google(texts[0])]
+
+        max_retries = 5
+        suffix = None
+
+        for attempt in range(max_retries):
+            suffix = self.suffix_scheduler.acquire(exclude=suffix)
+            translatorObj = self.get_google_translator(suffix)
+            bucket = self.get_rate_bucket(suffix)
+            try:
+                self.logger.debug(f"Translating batch of {len(texts)} texts using suffix: {suffix}")
+                bucket.acquire()
+                start_time = time.monotonic()
+                results = translatorObj.translate_batch(texts, self.dest_lang)
+                self.suffix_scheduler.report_success(suffix, time.monotonic() - start_time)
+                bucket.on_success()
+                if results is None:
+                    self.logger.warning(f"Batch of {len(texts)} texts could not be aligned, "
+                                        f"falling back to single requests.")
+                    return [self.translate_text_google(text) for text in texts]
+                self.logger.debug(f"Translated batch results: {results}")
+                return [self.format_result(text, result) for text, result in zip(texts, results)]
+            except Exception as e:
+                self.logger.warning(f"Error during batch translation attempt {attempt + 1} "
+                                    f"with suffix '{suffix}': {e}")
+                self.suffix_scheduler.report_failure(suffix, throttled=is_throttle_error(e))
+                wait_time = self.retry_delay(bucket, e, attempt)
+                self.logger.warning(f"Retrying in {wait_time:.2f} seconds...")
                 time.sleep(wait_time)
 
+        self.logger.critical("Batch translation failed after multiple attempts.")
+        return [{"original": text, "error": "Translation failed"} for text in texts]
+
+    async def translate_text_common_async(self, text):
+        """translate_text_common 的异步版本"""
+        max_retries = 3
+        engine = self.get_async_engine()
+
+        translatorObj = self.get_translator()
+        bucket = self.get_rate_bucket()
+
+        for attempt in range(max_retries):
+            try:
+                self.logger.debug(f"Translating text: {text} at {attempt} time")
+                await bucket.acquire_async()
+                async with engine.limit(self.translator_api):
+                    if hasattr(translatorObj, 'translate_async'):
+                        result = await translatorObj.translate_async(text, self.dest_lang)
+                    else:
+                        result = await asyncio.to_thread(translatorObj.translate, text, self.dest_lang)
+                bucket.on_success()
+                self.logger.debug(f"Translated result: {result}")
+                return self.format_result(text, result)
+            except Exception as e:
+                self.logger.warning(f"Error during translation attempt {attempt + 1}: {e}")
+                await asyncio.sleep(self.retry_delay(bucket, e, attempt))
+
         self.logger.critical("Translation failed after multiple attempts. Returning original text.")
         return {"original": text, "error": "Translation failed"}
 
+    async def translate_batch_common_async(self, texts):
+        """translate_batch_common 的异步版本"""
+        if len(texts) == 1:
+            return [await self.translate_text_common_async(texts[0])]
 
+        max_retries = 3
+        engine = self.get_async_engine()
+        translatorObj = self.get_translator()
+        bucket = self.get_rate_bucket()
+
+        for attempt in range(max_retries):
+            try:
+                self.logger.debug(f"Translating batch of {len(texts)} texts at {attempt} time")
+                await bucket.acquire_async()
+                async with engine.limit(self.translator_api):
+                    results = await translatorObj.translate_batch_async(texts, self.dest_lang)
+                bucket.on_success()
+                break
+            except Exception as e:
+                self.logger.warning(f"Error during batch translation attempt {attempt + 1}: {e}")
+                await asyncio.sleep(self.retry_delay(bucket, e, attempt))
+        else:
+            self.logger.critical("Batch translation failed after multiple attempts.")
+            return [{"original": text, "error": "Translation failed"} for text in texts]
+
+        if results is None:
+            middle = len(texts) // 2
+            self.logger.warning(f"Batch of {len(texts)} texts returned no usable reply, "
+                                f"splitting into {middle} + {len(texts) - middle}.")
+            halves = await asyncio.gather(self.translate_batch_common_async(texts[:middle]),
+                                          self.translate_batch_common_async(texts[middle:]))
+            return halves[0] + halves[1]
+
+        missing = [index for index, result in enumerate(results) if result is None]
+        formatted = [self.format_result(text, result) for text, result in zip(texts, results)]
+        if missing:
+            self.logger.warning(f"{len(missing)} of {len(texts)} texts in the batch could not be aligned, retrying them.")
+            retried = await self.translate_batch_common_async([texts[index] for index in missing])
+            for index, result in zip(missing, retried):
+                formatted[index] = result
+        self.logger.debug(f"Translated batch results: {formatted}")
+        return formatted
+
+    async def translate_text_google_async(self, text):
+        """translate_text_google 的异步版本"""
+        max_retries = 5
+        engine = self.get_async_engine()
+        suffix = None
+
+        for attempt in range(max_retries):
+            suffix = self.suffix_scheduler.acquire(exclude=suffix)
+            translatorObj = self.get_google_translator(suffix)
+            bucket = self.get_rate_bucket(suffix)
+            try:
+                self.logger.debug(f"Translating text: {text} using suffix: {suffix}")
+                await bucket.acquire_async()
+                async with engine.limit(suffix):
+                    start_time = time.monotonic()
+                    result = await translatorObj.translate_async(engine.client, text, self.dest_lang)
+                    self.suffix_scheduler.report_success(suffix, time.monotonic() - start_time)
+                bucket.on_success()
+                self.logger.debug(f"Translated result: {result}")
+                return self.format_result(text, result)
+            except Exception as e:
+                self.logger.warning(f"Error during translation attempt {attempt + 1} with suffix '{suffix}': {e}")
+                self.suffix_scheduler.report_failure(suffix, throttled=is_throttle_error(e))
+                wait_time = self.retry_delay(bucket, e, attempt)
+                self.logger.warning(f"Retrying in {wait_time:.2f} seconds...")
+                await asyncio.sleep(wait_time)
+
+        self.logger.critical("Translation failed after multiple attempts. Returning original text.")
+        return {"original": text, "error": "Translation failed"}
+
+    async def translate_batch_google_async(self, texts):
+        """translate_batch_google 的异步版本"""
+        if len(texts) == 1:
+            return [await self.translate_text_google_async(texts[0])]
+
+        max_retries = 5
+        engine = self.get_async_engine()
+        suffix = None
+
+        for attempt in range(max_retries):
+            suffix = self.suffix_scheduler.acquire(exclude=suffix)
+            translatorObj = self.get_google_translator(suffix)
+            bucket = self.get_rate_bucket(suffix)
+            try:
+                self.logger.debug(f"Translating batch of {len(texts)} texts using suffix: {suffix}")
+                await bucket.acquire_async()
+                async with engine.limit(suffix):
+                    start_time = time.monotonic()
+                    results = await translatorObj.translate_batch_async(engine.client, texts, self.dest_lang)
+                    self.suffix_scheduler.report_success(suffix, time.monotonic() - start_time)
+                bucket.on_success()
+                if results is None:
+                    self.logger.warning(f"Batch of {len(texts)} texts could not be aligned, "
+                                        f"falling back to single requests.")
+                    return list(await asyncio.gather(*(self.translate_text_google_async(text) for text in texts)))
+                self.logger.debug(f"Translated batch results: {results}")
+                return [self.format_result(text, result) for text, result in zip(texts, results)]
+            except Exception as e:
+                self.logger.warning(f"Error during batch translation attempt {attempt + 1} "
+                                    f"with suffix '{suffix}': {e}")
+                self.suffix_scheduler.report_failure(suffix, throttled=is_throttle_error(e))
+                wait_time = self.retry_delay(bucket, e, attempt)
+                self.logger.warning(f"Retrying in {wait_time:.2f} seconds...")
+                await asyncio.sleep(wait_time)
+
+        self.logger.critical("Batch translation failed after multiple attempts.")
+        return [{"original": text, "error": "Translation failed"} for text in texts]
 
     def format_result(self, original, translated):
-        """根据模式格式化翻译结果。"""
+        """根据模式格式化翻译结果。
+
+        接口返回的结果不可用（None、空字符串或错误提示）时原样返回，不做格式化，
+        双语模式下失败的结果不会变成“原文 [None]”而被当作译文保存。
+        """
+        if not self.is_storable(translated):
+            return translated
         if self.transMode == 1:
             return translated  # 仅返回翻译文本
         elif self.transMode == 2:
@@ -159,89 +659,235 @@ class XHTMLTranslator:
         else:
             raise ValueError("翻译模式错误")  # 抛出翻译模式错误
         
-    def process_xhtml(self, chapter_item, supported_tags):
-
+    def read_chapter(self, chapter_item):
+        """读取章节内容"""
         with open(chapter_item, 'r', encoding='utf-8') as file:
-            xhtml_content = file.read()
-
-        soup = BeautifulSoup(xhtml_content, 'html.parser')
-        self.logger.debug("Starting translation of paragraphs.")
-
-        # 支持翻译的标签
-        supported_tags = self.tags_to_translate
-        translations = []  # 存储待替换的文本与翻译结果
-
-        # 将 soup.descendants 转换为列表，以避免在遍历过程中修改结构
-        descendants = list(soup.descendants)
-
-        # 收集需要翻译的文本和对应的元素
-        texts_to_translate = []
-        for element in descendants:
-            # if isinstance(element, NavigableString) and element.strip() and element.parent.name in supported_tags:
-            if isinstance(element, NavigableString) and element.parent.name in supported_tags:
-                # 检查元素是否包含字母且不只是数字
-                if re.search(r'[a-zA-Z]', element) and not re.match(r'^\d+$', element):
-                    need_translate = element.strip()
-                    texts_to_translate.append((element, need_translate))  # 存储原始元素和文本
-        # self.logger.debug(f"texts_to_translate: {texts_to_translate}")
-
-        # 使用 ThreadPoolExecutor 进行并发翻译
-        with ThreadPoolExecutor(max_workers=self.TranslateThreadWorkers) as executor:
-            # 使用 tqdm 显示进度条
-            if self.translator_api == 'google':
-                future_to_text = {executor.submit(self.translate_text_google, text): (element, text) for element, text in
-                                  texts_to_translate}
-            else:
-                future_to_text = {executor.submit(self.translate_text_common, text): (element, text) for element, text in
-                                  texts_to_translate}
-
-            self.logger.debug(f"Total texts to translate: {len(future_to_text)}")
-
-            for future in tqdm(as_completed(future_to_text), total=len(future_to_text),
-                               desc=f"Translating the chapter '{chapter_item}'"):
-                element, original_text = future_to_text[future]
-                # time.sleep(random.uniform(0.1, 1))  # 随机等待时间，0.1到1秒
-                self.logger.debug(f"Processing translation for: '{original_text}' (Element: {element})")
-
-                translated_text = future.result()
-                self.logger.debug(f"Received translation for: '{original_text}': {translated_text}")
-
-                # if isinstance(translated_text, dict) and "error" in translated_text:
-                #     self.logger.error(f"Failed to translate '{original_text}': {translated_text['error']}")
-                #     continue
+            return file.read()
 
-                # 如果 translated_text 为空，直接返回，不再处理此文本
-                if translated_text is None or translated_text == "":
-                    self.logger.warning(f"Translated text is empty for '{original_text}'. Skipping to next.")
-                    return {"error": f"Translation error for '{chapter_item}'"}  # 返回错误信息
+    def write_chapter(self, chapter_item, xhtml_content):
+        """写入翻译后的章节内容"""
+        os.makedirs(os.path.dirname(chapter_item) or '.', exist_ok=True)
+        with open(chapter_item, 'w', encoding='utf-8') as file:
+            file.write(xhtml_content)
 
-                translations.append((element, translated_text))  # 存储原始元素和翻译结果
-                self.logger.debug(f"Successfully translated '{original_text}' to '{translated_text}'")
+    def process_xhtml(self, chapter_item, supported_tags):
+        """读取章节、翻译并写回，失败时返回错误字典"""
+        translated_content = self.translate_xhtml(self.read_chapter(chapter_item), chapter_item)
+        if isinstance(translated_content, dict):
+            return translated_content
+        self.write_chapter(chapter_item, translated_content)
+
+    def replace_segment(self, parser, handle, translated_text):
+        """把一个文本节点替换为译文，失败时只记录日志"""
+        try:
+            parser.replace_text(handle, translated_text)
+            self.logger.debug(f"Replaced with translated text: '{translated_text}'")
+        except AttributeError as e:
+            self.logger.warning(f"Invalid element: {handle}. Skipping. ")
+            self.logger.warning(f"The data class of the element: {type(handle)}")
+            self.logger.warning(f"The data class of the translated text: {type(translated_text)}")
+            self.logger.warning(f"Error details: {e}")
+        except Exception as e:
+            self.logger.warning(f"Error during translation of paragraphs: {e}")
+
+    def translate_xhtml(self, xhtml_content, chapter_item):
+        """翻译一个章节的 XHTML 内容
+
+        :param xhtml_content: 章节原文
+        :param chapter_item: 章节名称，用于日志和进度条
+        :return: 翻译后的 XHTML 字符串（章节已经翻译时原样返回），失败时返回错误字典
+        """
+        # 支持翻译的标签（集合）
+        supported_tags = self.segment_filter.tags
+
+        # 解析并提取需要翻译的文本节点 (handle, 文本)：配置了解析进程时在进程池中提取，handle 为节点序号，
+        # 译文收集到 translations 中，最后在进程池中回填和序列化；否则在当前线程解析。
+        # 同一次解析的文档先用于检测章节是否已经翻译（单独遍历，比例明显偏低时提前结束），章节只解析一次
+        parser = document = None
+        translations = {}
+        try:
+            if self.parse_processes > 0:
+                parser_name, detection, nodes = self.run_chapter_stage(chapter_stage.extract_segments, xhtml_content,
+                                                                       chapter_item, self.xhtml_parser.parser_name,
+                                                                       self.segment_filter)
+            else:
+                parser, document = self.xhtml_parser.parse(xhtml_content, chapter_item)
+                parser_name = parser.name
+                detection = self.segment_filter.detect_chapter(
+                    node_text for handle, node_text in parser.iter_text_nodes(document, supported_tags))
+                # 重新遍历并流式提交；跳过不包含源语言文字的节点（空白、数字、标点等）
+                nodes = ((handle, node_text) for handle, node_text in parser.iter_text_nodes(document, supported_tags)
+                         if self.segment_filter.is_translatable(node_text))
+        except Exception as e:
+            self.logger.error(f"Failed to parse chapter '{chapter_item}': {e}")
+            return {"error": f"Parse error for '{chapter_item}': {e}"}
+
+        # 按文本节点中目标语言文字的比例检测章节是否已翻译
+        self.logger.debug(f"Chapter {chapter_item}: {detection}")
+        if detection.status == CHAPTER_TRANSLATED:
+            self.logger.info(f"The chapter {chapter_item} seems to be translated already "
+                             f"({detection.ratio:.0%} of the text is in the target language).")
+            return xhtml_content
+        if detection.status == CHAPTER_PARTIAL:
+            # 已是目标语言的文本段会被分类器跳过，只发送其余文本段
+            self.logger.info(f"The chapter {chapter_item} is partially translated "
+                             f"({detection.translated_segments} segments already translated), "
+                             f"only untranslated segments will be sent.")
+        self.logger.debug(f"Starting translation of paragraphs with parser '{parser_name}'.")
+
+        segment_groups = {}  # 去重键 -> [原文, 该文本所有出现位置的 handle]，等待译文
+        known_translations = {}  # 去重键 -> 翻译记忆库中的译文
+        segment_futures = {}  # 登记的 Future -> 去重键
+        pending_replacements = []  # 解析器不能边遍历边替换时暂存的 (handle, 译文)
+        counts = {'total': 0, 'memory_hits': 0, 'journal_hits': 0, 'owned': 0}
+        # 上次中断前已完成的文本段，恢复时直接回放
+        journaled = self.load_segment_journal(chapter_item)
+        journal_buffer = []  # 等待写入文本段日志的 (哈希键, 译文)
+
+        def record_journal(text, translated_text):
+            if not self.is_storable(translated_text):
+                return
+            journal_buffer.append((self.journal_key(text), translated_text))
+            if len(journal_buffer) >= JOURNAL_BATCH_SIZE:
+                self.save_segment_journal(chapter_item, journal_buffer[:])
+                del journal_buffer[:]
+
+        def apply_translation(handles, translated_text):
+            if parser is None:
+                for handle in handles:
+                    translations[handle] = translated_text
+            elif parser.replace_in_place:
+                for handle in handles:
+                    self.replace_segment(parser, handle, translated_text)
+            else:
+                pending_replacements.extend((handle, translated_text) for handle in handles)
+
+        dedup_scope = self.dedup_scope(chapter_item)
+        unsubmitted = {}  # 本章节负责但尚未提交的 Future -> 原文
+
+        def iter_owned_segments():
+            """流式遍历文本节点：同一文本只翻译一次，先查翻译记忆库，未命中的在全书范围登记，
+            只返回由本章节负责请求的 (text, Future)，已由其他章节请求的文本直接等待其结果"""
+            for handle, node_text in nodes:
+                text = node_text.strip()
+                key = self.segment_dedup.make_key(text)
+                counts['total'] += 1
+
+                if key in known_translations:
+                    apply_translation([handle], known_translations[key])
+                    counts['memory_hits'] += 1
+                    continue
+                group = segment_groups.get(key)
+                if group is not None:
+                    group[1].append(handle)
+                    continue
+
+                if journaled:
+                    journal_text = journaled.get(self.journal_key(text))
+                    if journal_text is not None:
+                        known_translations[key] = journal_text
+                        apply_translation([handle], journal_text)
+                        counts['journal_hits'] += 1
+                        continue
+
+                cached_text = self.lookup_memory(text)
+                if cached_text is not None:
+                    known_translations[key] = cached_text
+                    apply_translation([handle], cached_text)
+                    counts['memory_hits'] += 1
+                    continue
+
+                segment_groups[key] = [text, [handle]]
+                future, is_owner = self.segment_dedup.claim(text, dedup_scope)
+                segment_futures[future] = key
+                if is_owner:
+                    counts['owned'] += 1
+                    unsubmitted[future] = text
+                    yield text, future
+
+        # 线程模式提交到所有章节共享的优先级线程池，异步模式提交到共享的异步引擎
+        priority = self.chapter_priorities.get(chapter_item, 0)
+        try:
+            # 谷歌接口按字符上限、智谱接口按 token 预算把多段文本合并为一个请求
+            batch_plan = None
+            if self.translator_api == 'google' and self.batch_max_chars > 0:
+                batch_plan = (self.translate_batch_google, self.translate_batch_google_async,
+                              self.batch_max_chars, len(BATCH_SEPARATOR), len)
+            elif self.translator_api == 'zhipu' and self.zhipu_batch_max_tokens > 0:
+                # 每段额外开销：编号“[n] ”和换行
+                batch_plan = (self.translate_batch_common, self.translate_batch_common_async,
+                              self.zhipu_batch_max_tokens, 3, estimate_tokens)
+
+            # 边提取边提交：每装满一批（或每得到一段）就立即开始翻译
+            if batch_plan is not None:
+                batch_func, batch_async_func, max_size, separator_size, size_func = batch_plan
+                for batch_segments in iter_packed(iter_owned_segments(), max_size, separator_size, size_func,
+                                                  itemgetter(0)):
+                    task = self.submit_translation(batch_func, batch_async_func,
+                                                   [text for text, _ in batch_segments], priority)
+                    for text, future in batch_segments:
+                        unsubmitted.pop(future)
+                    task.add_done_callback(partial(self.resolve_segments, batch_segments))
+            else:
+                if self.translator_api == 'google':
+                    translate_func, translate_async_func = self.translate_text_google, self.translate_text_google_async
+                else:
+                    translate_func, translate_async_func = self.translate_text_common, self.translate_text_common_async
+                for text, future in iter_owned_segments():
+                    task = self.submit_translation(translate_func, translate_async_func, text, priority)
+                    unsubmitted.pop(future)
+                    task.add_done_callback(partial(self.resolve_segments, [(text, future)]))
 
-        # 统一替换翻译结果
-        # for element, translated_text in translations:
-        #     try:
-        #         element.replace_with(translated_text)
-        #         self.logger.debug(f"Replaced with translated text: '{translated_text}'")
-        #     except Exception as e:
-        #         self.logger.warning(f"Error during translation of paragraphs: {e}")
+            self.logger.debug(f"Total texts: {counts['total']}, unique: {len(segment_groups)}, "
+                              f"memory hits: {counts['memory_hits']}, journal hits: {counts['journal_hits']}, "
+                              f"requested by this chapter: {counts['owned']}")
 
-        for element, translated_text in translations:
+            # 使用 tqdm 显示进度条
+            with tqdm(total=counts['total'] - counts['memory_hits'] - counts['journal_hits'],
+                      desc=f"Translating the chapter '{chapter_item}'") as progress:
+                for future in as_completed(segment_futures):
+                    text, handles = segment_groups.pop(segment_futures[future])
+                    translated_text = future.result()
+                    progress.update(len(handles))
+                    self.logger.debug(f"Received translation for: '{text}': {translated_text}")
+
+                    # 如果 translated_text 为空，直接返回，不再处理此文本
+                    if translated_text is None or translated_text == "":
+                        self.logger.warning(f"Translated text is empty for '{text}'. Skipping to next.")
+                        return {"error": f"Translation error for '{chapter_item}'"}  # 返回错误信息
+
+                    # 替换（或暂存）所有出现位置的译文
+                    apply_translation(handles, translated_text)
+                    record_journal(text, translated_text)
+                    self.logger.debug(f"Successfully translated '{text}' to '{translated_text}' "
+                                      f"({len(handles)} occurrences)")
+        finally:
+            # 提取或提交中途出错时，本章节负责但没有提交的文本段以失败结束，等待它们的其他章节不会永远阻塞
+            for future, text in unsubmitted.items():
+                self.segment_dedup.resolve(text, future, None)
+            # 出错提前返回时，把已经完成但尚未处理的文本段也记入日志，下次只请求缺失的部分
+            for future, key in segment_futures.items():
+                if key in segment_groups and future.done() and future.exception() is None:
+                    record_journal(segment_groups[key][0], future.result())
+            self.save_segment_journal(chapter_item, journal_buffer)
+
+        if parser is None:
+            # 在进程池中回填译文并序列化
             try:
-                element.replace_with(translated_text)
-                self.logger.debug(f"Replaced with translated text: '{translated_text}'")
-            except AttributeError as e:
-                self.logger.warning(f"Invalid element: {element}. Skipping. ")
-                self.logger.warning(f"The data class of the element: {type(element)}")
-                self.logger.warning(f"The data class of the translated text: {type(translated_text)}")
-                self.logger.warning(f"Error details: {e}")
-                continue
+                translated_content = self.run_chapter_stage(chapter_stage.apply_translations, xhtml_content,
+                                                            chapter_item, parser_name, supported_tags, translations)
             except Exception as e:
-                self.logger.warning(f"Error during translation of paragraphs: {e}")
+                self.logger.error(f"Failed to serialize chapter '{chapter_item}': {e}")
+                return {"error": f"Serialize error for '{chapter_item}': {e}"}
+            self.logger.debug(f"Finished translation of chapter '{chapter_item}'.")
+            return translated_content
+
+        # 统一替换暂存的翻译结果
+        for handle, translated_text in pending_replacements:
+            self.replace_segment(parser, handle, translated_text)
 
         self.logger.debug(f"Finished translation of chapter '{chapter_item}'.")
-        with open(chapter_item, 'w', encoding='utf-8') as file:
-            file.write(str(soup))
+        return parser.serialize(document)
 
 
 
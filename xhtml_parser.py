@@ -0,0 +1,118 @@
+"""
+章节解析层：统一的解析、文本节点遍历、替换和序列化接口。
+
+- lxml：按 XML 解析，直接遍历元素的 text/tail，序列化时保留命名空间、自闭合标签和 XML 声明；
+- html.parser：BeautifulSoup 的 html.parser，作为没有安装 lxml 或章节不是合法 XML 时的后备。
+"""
+import logging
+import threading
+
+from bs4 import BeautifulSoup, NavigableString
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+log = logging.getLogger(__name__)
+
+PARSER_NAMES = ('auto', 'lxml', 'html.parser')
+
+
+class SoupParser:
+    """基于 BeautifulSoup html.parser 的解析器"""
+    name = 'html.parser'
+    # 替换节点会改变 descendants 的遍历链，必须在遍历结束后再替换
+    replace_in_place = False
+
+    def parse(self, xhtml_content):
+        return BeautifulSoup(xhtml_content, 'html.parser')
+
+    def iter_text_nodes(self, document, supported_tags):
+        """依次返回父标签在 supported_tags 中的文本节点 (handle, text)"""
+        for element in document.descendants:
+            if isinstance(element, NavigableString) and element.parent.name in supported_tags:
+                yield element, str(element)
+
+    def replace_text(self, handle, translated_text):
+        handle.replace_with(translated_text)
+
+    def serialize(self, document):
+        return str(document)
+
+
+class LxmlParser:
+    """基于 lxml 的 XML 解析器，章节不是合法 XML 时 parse 抛出 etree.XMLSyntaxError"""
+    name = 'lxml'
+    # 只修改 text/tail 不改变树结构，可以在遍历过程中随时替换
+    replace_in_place = True
+
+    def __init__(self):
+        # lxml 的解析器对象不能被多个线程同时使用，每个线程各建一个
+        self._local = threading.local()
+
+    def _xml_parser(self):
+        xml_parser = getattr(self._local, 'xml_parser', None)
+        if xml_parser is None:
+            xml_parser = self._local.xml_parser = etree.XMLParser(resolve_entities=False, huge_tree=True)
+        return xml_parser
+
+    def parse(self, xhtml_content):
+        if isinstance(xhtml_content, str):
+            xhtml_content = xhtml_content.encode('utf-8')
+        return etree.fromstring(xhtml_content, self._xml_parser()).getroottree()
+
+    @staticmethod
+    def local_name(element):
+        return etree.QName(element).localname
+
+    def iter_text_nodes(self, document, supported_tags):
+        """依次返回父标签在 supported_tags 中的文本节点 (handle, text)，handle 为 (元素, 'text' 或 'tail')"""
+        for element in document.getroot().iter():
+            # 注释和处理指令本身不翻译，但其后的 tail 属于父元素的文本
+            if isinstance(element.tag, str) and element.text and self.local_name(element) in supported_tags:
+                yield (element, 'text'), element.text
+            if element.tail:
+                parent = element.getparent()
+                if parent is not None and self.local_name(parent) in supported_tags:
+                    yield (element, 'tail'), element.tail
+
+    def replace_text(self, handle, translated_text):
+        element, attribute = handle
+        setattr(element, attribute, translated_text)
+
+    def serialize(self, document):
+        return etree.tostring(document, encoding='utf-8', xml_declaration=True).decode('utf-8')
+
+
+class XHTMLParser:
+    """按配置选择章节解析器：auto 优先使用 lxml，解析失败时逐章退回 html.parser"""
+
+    def __init__(self, parser_name='auto'):
+        """
+        :param parser_name: auto、lxml 或 html.parser
+        """
+        if parser_name not in PARSER_NAMES:
+            raise ValueError(f"Unsupported xhtml parser: {parser_name}")
+        if parser_name == 'lxml' and etree is None:
+            raise RuntimeError("The lxml parser requires lxml, please run: pip install lxml")
+        self.parser_name = parser_name
+        self.soup_parser = SoupParser()
+        self.lxml_parser = LxmlParser() if etree is not None and parser_name != 'html.parser' else None
+
+    def parse(self, xhtml_content, chapter_item=''):
+        """解析章节
+
+        :return: (使用的解析器, 文档)
+        """
+        if self.lxml_parser is not None:
+            try:
+                return self.lxml_parser, self.lxml_parser.parse(xhtml_content)
+            except etree.XMLSyntaxError as e:
+                if self.parser_name == 'lxml':
+                    raise
+                log.debug(f"Chapter '{chapter_item}' is not well-formed XML ({e}), falling back to html.parser")
+        return self.soup_parser, self.soup_parser.parse(xhtml_content)
+
+    def __repr__(self):
+        return f"<XHTMLParser(parser_name='{self.parser_name}', lxml={self.lxml_parser is not None})>"